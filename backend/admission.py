@@ -0,0 +1,222 @@
+"""
+Module de contrôle d'admission pour /analyze
+- Nombre limité de requêtes en cours de traitement, avec une file d'attente bornée
+- Échéance (deadline) par requête: les étapes restantes sont sautées une fois l'échéance passée
+- Rejet rapide (503 + Retry-After) en cas de surcharge au lieu de laisser les requêtes s'accumuler
+- Modes dégradés sous pression (encodage réduit, puis réponses en cache uniquement)
+"""
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator, List
+import asyncio
+import math
+import os
+import time
+
+# Nombre maximum de requêtes traitées simultanément (par worker)
+MAX_IN_FLIGHT = int(os.getenv("ANALYZE_MAX_IN_FLIGHT", "4"))
+
+# Nombre maximum de requêtes en attente (au-delà: rejet immédiat)
+MAX_QUEUE = int(os.getenv("ANALYZE_MAX_QUEUE", "16"))
+
+# Attente maximale dans la file (secondes)
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ANALYZE_QUEUE_TIMEOUT_SECONDS", "5"))
+
+# Échéance d'une requête (secondes), bien en dessous du timeout de 60s du frontend
+REQUEST_DEADLINE_SECONDS = float(os.getenv("ANALYZE_DEADLINE_SECONDS", "20"))
+
+# Remplissage de la file à partir duquel l'encodage est réduit
+REDUCED_QUEUE_RATIO = 0.5
+
+# Remplissage de la file à partir duquel seules les réponses du cache sémantique sont servies
+CACHE_ONLY_QUEUE_RATIO = 0.85
+
+# Modes de fonctionnement
+MODE_NORMAL = "normal"
+MODE_REDUCED = "reduced"  # Encodage réduit (texte court, sans découpage), re-ranking hybride conservé
+MODE_CACHE_ONLY = "cache_only"  # Réponses du cache sémantique uniquement (sinon 503)
+
+
+class Overloaded(Exception):
+    """
+    Le serveur est surchargé: la requête est rejetée sans être traitée
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """
+    L'échéance de la requête est passée avant qu'un résultat soit disponible
+    """
+
+
+class Deadline:
+    """
+    Échéance absolue d'une requête
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        # Travaux non interruptibles (threads) qui peuvent survivre à la requête
+        self.pending: List[asyncio.Future] = []
+
+    def hold_until(self, future: asyncio.Future) -> None:
+        """
+        Garde la place d'admission réservée jusqu'à la fin d'un travail non interruptible
+        (thread d'encodage), même si la requête se termine avant (échéance dépassée)
+        """
+        self.pending.append(future)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        """
+        Lève DeadlineExceeded si l'échéance est passée avant l'étape donnée
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"Échéance dépassée avant l'étape: {stage}")
+
+
+class AdmissionController:
+    """
+    Limite le nombre de requêtes en cours et la taille de la file d'attente
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_queue_timeout = 0
+        self.deadline_exceeded = 0
+        self.abandoned = 0
+        self.degraded: Dict[str, int] = {}
+        # Moyenne glissante du temps de traitement (pour estimer Retry-After)
+        self.avg_service_seconds = 1.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Créé à la première utilisation, dans la boucle d'événements du worker
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        """
+        Estimation (en secondes) du temps avant qu'une place se libère
+        """
+        waves = (self.queued + self.in_flight) / max(1, self.max_in_flight)
+        return max(1, math.ceil(waves * self.avg_service_seconds))
+
+    def pressure(self) -> float:
+        """
+        Taux de remplissage de la file d'attente (entre 0 et 1)
+        """
+        return min(1.0, self.queued / self.max_queue) if self.max_queue else 0.0
+
+    def mode(self) -> str:
+        """
+        Mode de fonctionnement selon la pression actuelle
+        """
+        pressure = self.pressure()
+        if pressure >= CACHE_ONLY_QUEUE_RATIO:
+            return MODE_CACHE_ONLY
+        if pressure >= REDUCED_QUEUE_RATIO:
+            return MODE_REDUCED
+        return MODE_NORMAL
+
+    @asynccontextmanager
+    async def admit(self, deadline: Deadline) -> AsyncIterator[str]:
+        """
+        Réserve une place de traitement (ou lève Overloaded)
+
+        Args:
+            deadline: Échéance de la requête (l'attente dans la file ne la dépasse pas)
+
+        Yields:
+            Le mode de fonctionnement à appliquer à cette requête
+        """
+        semaphore = self._get_semaphore()
+        mode = self.mode()
+
+        if semaphore.locked():
+            if self.queued >= self.max_queue:
+                self.shed_queue_full += 1
+                raise Overloaded("Serveur surchargé, réessayez plus tard", self.retry_after())
+
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=min(self.queue_timeout, deadline.remaining()))
+            except asyncio.TimeoutError:
+                self.shed_queue_timeout += 1
+                raise Overloaded("Serveur surchargé, réessayez plus tard", self.retry_after())
+            finally:
+                self.queued -= 1
+        else:
+            await semaphore.acquire()
+
+        # Peu de temps restant après l'attente: encodage réduit
+        if mode == MODE_NORMAL and deadline.remaining() < self.avg_service_seconds:
+            mode = MODE_REDUCED
+
+        self.in_flight += 1
+        self.admitted += 1
+        if mode != MODE_NORMAL:
+            self.degraded[mode] = self.degraded.get(mode, 0) + 1
+        started = time.monotonic()
+        try:
+            yield mode
+        except DeadlineExceeded:
+            self.deadline_exceeded += 1
+            raise
+        finally:
+            self.avg_service_seconds = 0.9 * self.avg_service_seconds + 0.1 * (time.monotonic() - started)
+            pending = [future for future in deadline.pending if not future.done()]
+            if pending:
+                # La requête a rendu la main mais un thread calcule encore:
+                # la place n'est libérée qu'à sa fin (MAX_IN_FLIGHT reste respecté)
+                self.abandoned += 1
+                waiter = asyncio.gather(*pending, return_exceptions=True)
+                waiter.add_done_callback(lambda _: self._release(semaphore))
+            else:
+                self._release(semaphore)
+
+    def _release(self, semaphore: asyncio.Semaphore) -> None:
+        self.in_flight -= 1
+        semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Statistiques d'admission (profondeur de file, rejets, modes dégradés)
+        """
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "peak_queue_depth": self.peak_queued,
+            "mode": self.mode(),
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_queue_timeout": self.shed_queue_timeout,
+            "deadline_exceeded": self.deadline_exceeded,
+            "abandoned_encodes": self.abandoned,
+            "degraded": dict(self.degraded),
+            "avg_service_ms": round(self.avg_service_seconds * 1000, 1),
+        }
+
+
+# Contrôleur global de /analyze
+controller = AdmissionController()
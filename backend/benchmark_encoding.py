@@ -0,0 +1,89 @@
+"""
+Benchmark de l'encodage selon la longueur des textes
+Mesure la latence par tranche de longueur:
+- "brut": le texte est encodé tel quel (tronqué silencieusement par le modèle)
+- "politique": limite en caractères + découpage en morceaux (input_policy)
+Et compare, pour un lot de longueurs mélangées, l'encodage en un seul appel
+et l'encodage regroupé par longueur (generate_embeddings)
+
+USAGE:
+    python3 benchmark_encoding.py [répétitions]
+"""
+import random
+import statistics
+import sys
+import time
+import input_policy
+import vector_search
+
+SENTENCES = [
+    "Le Wydad a signé un nouveau défenseur pour la saison prochaine.",
+    "Ziyech a marqué le but de la victoire lors du derby contre le Raja.",
+    "L'entraîneur a annoncé la liste des joueurs convoqués pour le match.",
+    "Le club a confirmé la blessure de son attaquant pendant l'entraînement.",
+    "Les supporters attendent le premier match de la saison au stade Mohammed V.",
+    "La direction négocie le transfert d'un milieu de terrain international.",
+]
+
+# Tranches de longueur (en caractères)
+BANDS = [80, 300, 1000, 3000, 5000, 10000]
+
+
+def make_text(length: int, rng: random.Random) -> str:
+    text = ""
+    while len(text) < length:
+        text += rng.choice(SENTENCES) + " "
+    return text[:length]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(repeat: int = 20):
+    rng = random.Random(0)
+    model = vector_search.get_model()
+    # Préchauffage
+    vector_search.generate_embedding("échauffement")
+
+    print(f"Modèle: {vector_search.MODEL_NAME} (max_seq_length={model.max_seq_length})")
+    print(f"Limite: {input_policy.MAX_INPUT_CHARS} caractères, agrégation: {input_policy.CHUNK_POOLING}\n")
+    print(f"{'caractères':>10} {'morceaux':>9} {'brut p50':>9} {'brut p95':>9} {'pol. p50':>9} {'pol. p95':>9}  (ms)")
+
+    for band in BANDS:
+        texts = [make_text(band, rng) for _ in range(repeat)]
+        raw, policy = [], []
+        chunks = 0
+        for text in texts:
+            started = time.perf_counter()
+            vector_search.generate_embedding(text)
+            raw.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            capped = input_policy.cap_text(text)
+            embedding = vector_search.encode_query(capped)
+            policy.append((time.perf_counter() - started) * 1000)
+            chunks = 1 if embedding.ndim == 1 else len(embedding)
+
+        print(f"{band:>10} {chunks:>9} {statistics.median(raw):>9.1f} {percentile(raw, 0.95):>9.1f} "
+              f"{statistics.median(policy):>9.1f} {percentile(policy, 0.95):>9.1f}")
+
+    # Lot de longueurs mélangées (analyse en masse)
+    mixed = [make_text(rng.choice([60, 120, 400, 1200]), rng) for _ in range(256)]
+
+    started = time.perf_counter()
+    model.encode(mixed, batch_size=64, convert_to_numpy=True, show_progress_bar=False)
+    single_call = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vector_search.generate_embeddings(mixed)
+    bucketed = time.perf_counter() - started
+
+    print(f"\nLot mélangé de {len(mixed)} textes:")
+    print(f"  un seul appel (lots de 64): {single_call * 1000:.0f} ms")
+    print(f"  regroupé par longueur:      {bucketed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,264 @@
+"""
+Module d'analyse en masse
+Lit un fichier JSONL ou CSV par blocs de taille fixe, analyse chaque bloc
+(encodage par lot + recherche vectorielle) et produit les résultats en NDJSON
+au fur et à mesure. La mémoire utilisée ne dépend que de la taille d'un bloc.
+"""
+from typing import Iterator, List, Dict, Any, Optional, Callable, Awaitable, AsyncIterator, BinaryIO, Tuple
+import asyncio
+import codecs
+import csv
+import json
+import os
+import time
+import input_policy
+
+# Taille des blocs (nombre de lignes analysées ensemble)
+DEFAULT_CHUNK_SIZE = 256
+MAX_CHUNK_SIZE = 1024
+
+# Champ contenant le texte à analyser (JSONL: clé, CSV: nom de colonne)
+DEFAULT_TEXT_FIELD = "text"
+
+# Champs repris tels quels dans la sortie pour identifier la ligne
+ID_FIELDS = ("id", "_id", "post_id", "url")
+
+SUPPORTED_FORMATS = ("jsonl", "csv")
+
+# Nombre d'analyses en masse simultanées (par worker): au-delà, rejet (429)
+# L'encodage par lot ne doit pas prendre tout le CPU nécessaire aux requêtes /analyze
+MAX_CONCURRENT_JOBS = int(os.getenv("BULK_MAX_CONCURRENT_JOBS", "1"))
+
+# Analyses en masse en cours dans ce worker
+_running_jobs = 0
+
+# Taille maximale d'une cellule CSV (la limite par défaut du module csv est de 128 Ko)
+# Au-delà, la ligne est signalée en erreur sans interrompre l'analyse
+MAX_CSV_FIELD_SIZE = 4 * 1024 * 1024
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """
+    Détermine le format du fichier (jsonl ou csv) à partir de son nom ou de son type MIME
+
+    Returns:
+        "jsonl", "csv" ou None si le format n'est pas reconnu
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    if content_type:
+        if "csv" in content_type:
+            return "csv"
+        if "ndjson" in content_type or "jsonl" in content_type or "json" in content_type:
+            return "jsonl"
+    return None
+
+
+def _make_record(line: int, data: Dict[str, Any], text_field: str) -> Dict[str, Any]:
+    """
+    Construit un enregistrement {line, id, text, error} à partir d'une ligne parsée
+    """
+    record = {"line": line, "id": None, "text": None, "error": None}
+    for field in ID_FIELDS:
+        if data.get(field) not in (None, ""):
+            record["id"] = str(data[field])
+            break
+
+    text = data.get(text_field)
+    if not isinstance(text, str) or not text.strip():
+        record["error"] = f"Champ '{text_field}' absent ou vide"
+    else:
+        # Limite en caractères dès la lecture: un bloc reste borné en mémoire
+        record["text"] = input_policy.cap_text(text.strip())
+    return record
+
+
+def _iter_records(fileobj: BinaryIO, file_format: str, text_field: str) -> Iterator[Dict[str, Any]]:
+    """
+    Itère sur les enregistrements du fichier, ligne par ligne (sans tout charger)
+    """
+    lines = codecs.iterdecode(fileobj, "utf-8-sig", errors="replace")
+
+    if file_format == "csv":
+        csv.field_size_limit(max(csv.field_size_limit(), MAX_CSV_FIELD_SIZE))
+        # strict: un guillemet non fermé en fin de fichier est une erreur, pas une cellule silencieusement tronquée
+        reader = csv.DictReader(lines, strict=True)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # Ligne invalide (cellule trop grande, guillemets mal fermés): signalée, lecture poursuivie
+                yield {"line": reader.line_num, "id": None, "text": None, "error": f"CSV invalide: {e}"}
+                continue
+            yield _make_record(reader.line_num, row, text_field)
+
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"line": line_number, "id": None, "text": None, "error": f"JSON invalide: {e.msg}"}
+            continue
+        if not isinstance(data, dict):
+            yield {"line": line_number, "id": None, "text": None, "error": "La ligne doit être un objet JSON"}
+            continue
+        yield _make_record(line_number, data, text_field)
+
+
+def iter_record_chunks(fileobj: BinaryIO, file_format: str, text_field: str = DEFAULT_TEXT_FIELD,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Découpe le fichier en blocs d'au plus chunk_size enregistrements
+
+    Args:
+        fileobj: Fichier binaire (lecture séquentielle)
+        file_format: "jsonl" ou "csv"
+        text_field: Champ contenant le texte à analyser
+        chunk_size: Nombre d'enregistrements par bloc
+
+    Yields:
+        Listes d'enregistrements {line, id, text, error}
+    """
+    chunk = []
+    for record in _iter_records(fileobj, file_format, text_field):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def start_job() -> Optional[Callable[[], None]]:
+    """
+    Réserve une place d'analyse en masse
+
+    Returns:
+        Fonction libérant la place (appelable plusieurs fois sans effet supplémentaire),
+        None si MAX_CONCURRENT_JOBS analyses sont déjà en cours
+    """
+    global _running_jobs
+    if _running_jobs >= MAX_CONCURRENT_JOBS:
+        return None
+    _running_jobs += 1
+    released = False
+
+    def release() -> None:
+        global _running_jobs
+        nonlocal released
+        if not released:
+            released = True
+            _running_jobs -= 1
+
+    return release
+
+
+def running_jobs() -> int:
+    return _running_jobs
+
+
+async def release_when_done(stream: AsyncIterator[str], release: Callable[[], None]) -> AsyncIterator[str]:
+    """
+    Libère la place d'analyse à la fin du flux (terminé, annulé ou en erreur)
+    """
+    try:
+        async for line in stream:
+            yield line
+    finally:
+        release()
+
+
+def _file_size(fileobj: BinaryIO) -> Optional[int]:
+    """
+    Taille totale du fichier (None si le flux n'est pas positionnable)
+    """
+    try:
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        return size
+    except (OSError, AttributeError, ValueError):
+        return None
+
+
+def _ndjson(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+
+
+async def stream_analysis(fileobj: BinaryIO, file_format: str,
+                          analyze: Callable[[List[str]], Awaitable[List[Tuple[Optional[Dict[str, Any]], float, str]]]],
+                          make_result: Callable[[Dict[str, Any], float, str], Dict[str, Any]],
+                          is_disconnected: Callable[[], Awaitable[bool]],
+                          text_field: str = DEFAULT_TEXT_FIELD,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[str]:
+    """
+    Analyse le fichier bloc par bloc et produit des lignes NDJSON
+
+    Types de lignes produites:
+    - "result": résultat d'une ligne du fichier (construit par make_result)
+    - "error": ligne invalide ou sans résultat
+    - "progress": avancement après chaque bloc
+    - "summary": bilan final (ou arrêt si le client s'est déconnecté)
+
+    Args:
+        fileobj: Fichier binaire téléversé
+        file_format: "jsonl" ou "csv"
+        analyze: Analyse d'un lot de textes (vector_search.find_closest_articles_batch_async)
+        make_result: Construit les champs de résultat à partir de (document, score, langue)
+        is_disconnected: Coroutine indiquant si le client a annulé la requête
+        text_field: Champ contenant le texte à analyser
+        chunk_size: Nombre d'enregistrements par bloc
+    """
+    started = time.perf_counter()
+    total_bytes = _file_size(fileobj)
+    chunks = iter_record_chunks(fileobj, file_format, text_field, chunk_size)
+    processed = 0
+    errors = 0
+
+    while True:
+        if await is_disconnected():
+            yield _ndjson({"type": "summary", "status": "cancelled", "processed": processed, "errors": errors})
+            return
+
+        # La lecture/le parsing du bloc suivant se fait dans un thread (I/O disque)
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+
+        valid = [record for record in chunk if record["error"] is None]
+        ranked = await analyze([record["text"] for record in valid]) if valid else []
+        results = {id(record): result for record, result in zip(valid, ranked)}
+
+        lines = []
+        for record in chunk:
+            processed += 1
+            result = results.get(id(record))
+            if result is not None and result[0] is None:
+                record["error"] = "Aucun article trouvé dans la base de données"
+            if record["error"] is not None:
+                errors += 1
+                lines.append(_ndjson({"type": "error", "line": record["line"], "id": record["id"],
+                                      "detail": record["error"]}))
+                continue
+            doc, score, language = result
+            payload = {"type": "result", "line": record["line"], "id": record["id"]}
+            payload.update(make_result(doc, score, language))
+            lines.append(_ndjson(payload))
+
+        progress = {"type": "progress", "processed": processed, "errors": errors}
+        if total_bytes:
+            bytes_read = min(fileobj.tell(), total_bytes)
+            progress.update({"bytes_read": bytes_read, "total_bytes": total_bytes,
+                             "percent": round(100 * bytes_read / total_bytes, 1)})
+        lines.append(_ndjson(progress))
+        yield "".join(lines)
+
+    yield _ndjson({"type": "summary", "status": "completed", "processed": processed, "errors": errors,
+                   "elapsed_seconds": round(time.perf_counter() - started, 2)})
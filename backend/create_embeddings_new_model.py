@@ -1,99 +1,52 @@
 """
-Script pour recréer les embeddings avec un modèle multilingue plus performant
-Ce script utilise paraphrase-multilingual-mpnet-base-v2 qui est beaucoup mieux pour le français
+Script pour créer les embeddings avec un nouveau modèle, sans interruption de service
+Par défaut, utilise paraphrase-multilingual-mpnet-base-v2 qui est beaucoup mieux pour le français
+
+Les embeddings sont créés dans une nouvelle version (collection wydad_vector__<version>):
+la version actuellement servie (wydad_vector) n'est ni vidée ni modifiée.
 
 USAGE:
-1. Sauvegardez votre collection wydad_vector actuelle (backup)
-2. Videz wydad_vector: db.wydad_vector.deleteMany({})
-3. Exécutez ce script: python3 create_embeddings_new_model.py
+1. Exécutez ce script: python3 create_embeddings_new_model.py [nom du modèle]
+2. (Optionnel) Comparez la nouvelle version sur le trafic réel: POST /versions/<version>/shadow
+3. Activez-la sans redémarrer: POST /versions/<version>/activate
+4. En cas de problème, retour arrière instantané: POST /versions/rollback
 """
 
-from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
+import sys
 from tqdm import tqdm
-import numpy as np
-from datetime import datetime
-
-# -------------------------
-# MongoDB
-# -------------------------
-MONGO_URI = "mongodb://localhost:27017"
-client = MongoClient(MONGO_URI)
-
-db = client["elbotola"]
-source_collection = db["wydad_news"]
-vector_collection = db["wydad_vector"]
+import embedding_versions
 
 # -------------------------
 # Nouveau Modèle Multilingue Performant
 # -------------------------
-print("📦 Chargement du modèle multilingue performant...")
-print("⚠️  Ce modèle est plus lent mais beaucoup plus précis pour le français")
-print("   Temps estimé: ~10-15 minutes pour 3000 articles\n")
-
 # Option 1: Très performant (768 dimensions)
-model = SentenceTransformer("paraphrase-multilingual-mpnet-base-v2")
+DEFAULT_MODEL = "paraphrase-multilingual-mpnet-base-v2"
 
 # Option 2: Bon compromis (384 dimensions, comme avant)
-# model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-
-print(f"✅ Modèle chargé: {model.get_sentence_embedding_dimension()} dimensions\n")
-
-# -------------------------
-# Vérification
-# -------------------------
-existing_count = vector_collection.count_documents({})
-if existing_count > 0:
-    response = input(f"⚠️  La collection wydad_vector contient {existing_count} documents.\n"
-                     "   Voulez-vous les supprimer et recréer? (oui/non): ")
-    if response.lower() in ['oui', 'o', 'yes', 'y']:
-        vector_collection.delete_many({})
-        print("✅ Collection vidée\n")
-    else:
-        print("❌ Annulé. Les embeddings existants seront conservés.\n")
-        exit()
-
-# -------------------------
-# Lecture des documents
-# -------------------------
-documents = list(source_collection.find())
-print(f"🔎 {len(documents)} documents trouvés dans wydad_news\n")
-
-inserted = 0
-skipped = 0
-
-for doc in tqdm(documents, desc="Création des embeddings"):
-    url = doc.get("url")
-
-    # Éviter les doublons (au cas où)
-    if vector_collection.find_one({"url": url}):
-        skipped += 1
-        continue
+# DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
 
-    texts = []
+model_name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MODEL
 
-    if doc.get("title_fr"):
-        texts.append(("fr", doc["title_fr"]))
+print(f"📦 Construction d'une nouvelle version d'embeddings avec {model_name}...")
+print("   La version actuelle continue de servir pendant la construction\n")
 
-    if doc.get("title_en"):
-        texts.append(("en", doc["title_en"]))
+progress_bar = tqdm(desc="Création des embeddings", unit="articles")
 
-    for lang, text in texts:
-        # Générer l'embedding avec le nouveau modèle
-        embedding = model.encode(text, show_progress_bar=False).tolist()
 
-        vector_doc = {
-            "url": url,
-            "language": lang,
-            "text": text,
-            "embedding": embedding,
-            "created_at": datetime.utcnow()
-        }
+def report(processed, total):
+    progress_bar.total = total
+    progress_bar.n = processed
+    progress_bar.refresh()
 
-        vector_collection.insert_one(vector_doc)
-        inserted += 1
 
-print(f"\n✅ {inserted} vecteurs créés avec le nouveau modèle")
-print(f"⏭️  {skipped} documents ignorés (doublons)")
-print(f"\n📝 N'oubliez pas de mettre à jour MODEL_NAME dans vector_search.py !")
+try:
+    version = embedding_versions.build_version(model_name, progress=report)
+except ValueError as e:
+    progress_bar.close()
+    print(f"\n❌ {e}")
+    sys.exit(1)
+progress_bar.close()
 
+print(f"\n✅ {version['count']} vecteurs créés ({version['dimension']} dimensions)")
+print(f"📁 Collection: {version['collection']}")
+print(f"\n📝 Pour activer cette version: POST /versions/{version['_id']}/activate")
@@ -1,15 +1,126 @@
 """
 Module de connexion à MongoDB
 Gère la connexion à la base de données MongoDB locale
+- Client synchrone (pymongo) pour les scripts et le chemin historique
+- Client asynchrone (Motor) pour les handlers FastAPI
+Les deux clients partagent la même configuration de pool de connexions
 """
-from pymongo import MongoClient
-from typing import Optional
+from pymongo import MongoClient, monitoring
+from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Optional, Dict, Any
+import os
+import threading
+import time
 
 # Configuration de connexion MongoDB (local)
 MONGO_URI = "mongodb://localhost:27017/"
 DATABASE_NAME = "elbotola"  # Nom de la base de données
 NEWS_COLLECTION_NAME = "wydad_news"  # Collection des actualités (3000 articles)
 VECTORS_COLLECTION_NAME = "wydad_vector"  # Collection des vectorisations (6004 vectorisations - titres FR et EN)
+VERSIONS_COLLECTION_NAME = "embedding_versions"  # Registre des versions d'embeddings (modèle, dimension, collection)
+
+# Configuration du pool de connexions (surchargeable par variables d'environnement)
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))  # Attente max d'une connexion libre
+CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primaryPreferred")
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Collecte les statistiques du pool de connexions (utilisation et temps d'attente)
+    Les événements de checkout sont émis dans le thread qui exécute l'opération
+    (y compris les threads internes de Motor), ce qui permet de mesurer l'attente par thread
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._checkout_started: Dict[int, float] = {}
+        self.open_connections = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.pool_clears = 0
+
+    def _end_wait(self) -> Optional[float]:
+        started = self._checkout_started.pop(threading.get_ident(), None)
+        if started is None:
+            return None
+        return (time.perf_counter() - started) * 1000
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._checkout_started[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._end_wait()
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            wait_ms = self._end_wait()
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+            if wait_ms is not None:
+                self.total_wait_ms += wait_ms
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retourne une copie des statistiques courantes
+        """
+        with self._lock:
+            return {
+                "max_pool_size": self.max_pool_size,
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "utilization": round(self.checked_out / self.max_pool_size, 4) if self.max_pool_size else 0.0,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "pool_clears": self.pool_clears,
+            }
+
 
 # Client MongoDB global
 _client: Optional[MongoClient] = None
@@ -17,6 +128,30 @@ _database = None
 _news_collection = None
 _vectors_collection = None
 
+# Client Motor global (asynchrone)
+_async_client: Optional[AsyncIOMotorClient] = None
+
+# Statistiques de pool (une instance par client)
+_sync_pool_stats = PoolStatsListener(MAX_POOL_SIZE)
+_async_pool_stats = PoolStatsListener(MAX_POOL_SIZE)
+
+
+def _client_options(listener: PoolStatsListener) -> Dict[str, Any]:
+    """
+    Options communes aux clients synchrone et asynchrone
+    """
+    return {
+        "maxPoolSize": MAX_POOL_SIZE,
+        "minPoolSize": MIN_POOL_SIZE,
+        "maxIdleTimeMS": MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": SOCKET_TIMEOUT_MS,
+        "readPreference": READ_PREFERENCE,
+        "event_listeners": [listener],
+    }
+
 
 def get_client() -> MongoClient:
     """
@@ -24,7 +159,7 @@ def get_client() -> MongoClient:
     """
     global _client
     if _client is None:
-        _client = MongoClient(MONGO_URI)
+        _client = MongoClient(MONGO_URI, **_client_options(_sync_pool_stats))
     return _client
 
 
@@ -61,6 +196,13 @@ def get_vectors_collection():
     return _vectors_collection
 
 
+def get_versions_collection():
+    """
+    Retourne la collection du registre des versions d'embeddings
+    """
+    return get_database()[VERSIONS_COLLECTION_NAME]
+
+
 def get_collection():
     """
     Retourne la collection des vectorisations (par défaut pour compatibilité)
@@ -68,12 +210,71 @@ def get_collection():
     return get_vectors_collection()
 
 
+def get_async_client() -> AsyncIOMotorClient:
+    """
+    Retourne le client Motor (singleton)
+    Doit être appelé depuis la boucle d'événements qui l'utilisera
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncIOMotorClient(MONGO_URI, **_client_options(_async_pool_stats))
+    return _async_client
+
+
+def get_async_database():
+    """
+    Retourne la base de données MongoDB (Motor)
+    """
+    return get_async_client()[DATABASE_NAME]
+
+
+def get_async_news_collection():
+    """
+    Retourne la collection des actualités (wydad_news) pour le chemin asynchrone
+    """
+    return get_async_database()[NEWS_COLLECTION_NAME]
+
+
+def get_async_vectors_collection():
+    """
+    Retourne la collection des vectorisations pour le chemin asynchrone
+    """
+    return get_async_database()[VECTORS_COLLECTION_NAME]
+
+
+def get_async_versions_collection():
+    """
+    Retourne la collection du registre des versions d'embeddings pour le chemin asynchrone
+    """
+    return get_async_database()[VERSIONS_COLLECTION_NAME]
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Retourne les statistiques d'utilisation des pools de connexions
+
+    Returns:
+        Dictionnaire avec les statistiques des clients 'sync' et 'async'
+    """
+    return {
+        "sync": _sync_pool_stats.snapshot(),
+        "async": _async_pool_stats.snapshot(),
+        "read_preference": READ_PREFERENCE,
+        "wait_queue_timeout_ms": WAIT_QUEUE_TIMEOUT_MS,
+    }
+
+
 def close_connection():
     """
-    Ferme la connexion MongoDB
+    Ferme les connexions MongoDB (synchrone et asynchrone)
     """
-    global _client
+    global _client, _database, _news_collection, _vectors_collection, _async_client
     if _client is not None:
         _client.close()
         _client = None
-
+        _database = None
+        _news_collection = None
+        _vectors_collection = None
+    if _async_client is not None:
+        _async_client.close()
+        _async_client = None
@@ -0,0 +1,498 @@
+"""
+Module de gestion des versions d'embeddings
+Permet de changer de modèle sans interruption de service:
+1. Construction en arrière-plan d'une nouvelle version (modèle + dimension) dans sa propre collection,
+   pendant que l'ancienne version continue de servir
+2. Bascule atomique: le nouveau modèle et le nouvel index sont chargés puis installés ensemble
+3. Retour arrière instantané: la version précédente reste en mémoire
+4. Mode shadow optionnel: une version candidate est évaluée sur le trafic réel sans servir de réponses
+
+Registre (collection embedding_versions):
+- Un document par version: {_id, model_name, dimension, collection, status, count, created_at, built_at}
+- Un document "__active__": {version_id, previous_version_id, updated_at}
+La collection historique wydad_vector est enregistrée comme version du modèle par défaut (MODEL_NAME)
+"""
+from typing import Dict, Any, Optional, List, Callable
+from datetime import datetime
+import asyncio
+import os
+import re
+import db
+import vector_index
+import vector_search
+
+# Identifiant du document pointant vers la version active
+ACTIVE_POINTER_ID = "__active__"
+
+# Statuts d'une version
+STATUS_BUILDING = "building"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+# Modèles autorisés pour une construction lancée par l'API (POST /versions/build)
+# (le script create_embeddings_new_model.py, exécuté par un opérateur, n'est pas limité)
+ALLOWED_MODELS = tuple(name.strip() for name in os.getenv(
+    "ALLOWED_EMBEDDING_MODELS",
+    "all-MiniLM-L6-v2,paraphrase-multilingual-mpnet-base-v2,paraphrase-multilingual-MiniLM-L12-v2"
+).split(",") if name.strip())
+
+# Nombre de titres encodés par lot lors de la construction
+BUILD_BATCH_SIZE = 256
+
+# Vérification périodique de la version active (bascule faite par un autre worker)
+WATCH_INTERVAL_SECONDS = 30
+
+# Nombre maximum de comparaisons shadow en cours (au-delà, la requête n'est pas comparée)
+SHADOW_MAX_PENDING = 4
+
+# État en mémoire du processus
+_previous: Optional[vector_index.VectorIndex] = None  # Version précédente (retour arrière instantané)
+_shadow: Optional[vector_index.VectorIndex] = None  # Version évaluée en shadow
+_switch_lock: Optional[asyncio.Lock] = None
+_builds: Dict[str, asyncio.Task] = {}
+_shadow_tasks: set = set()
+_shadow_stats: Dict[str, Any] = {}
+
+
+def make_version_id(model_name: str, dimension: int) -> str:
+    """
+    Identifiant d'une version: nom du modèle normalisé + dimension
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", model_name.lower()).strip("-")
+    return f"{slug}-{dimension}"
+
+
+def _collection_for(version_id: str) -> str:
+    return f"{db.VECTORS_COLLECTION_NAME}__{version_id}"
+
+
+def _source(version: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Source d'index (vector_index) correspondant à un document de version
+    """
+    return {"version_id": version["_id"], "model_name": version["model_name"], "collection": version["collection"]}
+
+
+def _legacy_version() -> Dict[str, Any]:
+    """
+    Version correspondant à la collection historique wydad_vector
+    """
+    dimension = vector_search.get_model(vector_search.MODEL_NAME).get_sentence_embedding_dimension()
+    return {
+        "_id": make_version_id(vector_search.MODEL_NAME, dimension),
+        "model_name": vector_search.MODEL_NAME,
+        "dimension": dimension,
+        "collection": db.VECTORS_COLLECTION_NAME,
+        "status": STATUS_READY,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _reset_shadow_stats() -> None:
+    _shadow_stats.clear()
+    _shadow_stats.update({"compared": 0, "same_article": 0, "abs_score_delta_sum": 0.0,
+                          "skipped": 0, "errors": 0})
+
+
+_reset_shadow_stats()
+
+
+# -------------------------
+# Initialisation (version active au démarrage)
+# -------------------------
+
+def get_active_version_sync() -> Dict[str, Any]:
+    """
+    Retourne la version active du registre (enregistre la version historique si le registre est vide)
+    """
+    versions = db.get_versions_collection()
+    pointer = versions.find_one({"_id": ACTIVE_POINTER_ID})
+    if pointer:
+        version = versions.find_one({"_id": pointer["version_id"]})
+        if version:
+            return version
+
+    legacy = _legacy_version()
+    fields = {key: value for key, value in legacy.items() if key != "_id"}
+    versions.update_one({"_id": legacy["_id"]}, {"$setOnInsert": fields}, upsert=True)
+    return legacy
+
+
+def initialize_sync() -> vector_index.VectorIndex:
+    """
+    Charge le modèle et l'index de la version active (synchrone, processus parent gunicorn)
+    """
+    version = get_active_version_sync()
+    vector_search.get_model(version["model_name"])
+    vector_index.install(vector_index.build_index(_source(version)))
+    return vector_index.current()
+
+
+async def initialize() -> vector_index.VectorIndex:
+    """
+    Charge le modèle et l'index de la version active sans bloquer la boucle d'événements
+    """
+    version = await asyncio.to_thread(get_active_version_sync)
+    await asyncio.to_thread(vector_search.get_model, version["model_name"])
+    vector_index.install(await vector_index.build_index_async(_source(version)))
+    return vector_index.current()
+
+
+# -------------------------
+# Construction d'une nouvelle version
+# -------------------------
+
+def build_version(model_name: str, progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+    """
+    Construit une version d'embeddings dans sa propre collection (wydad_vector__<version>)
+    La version servie n'est pas modifiée. Synchrone: à exécuter dans un thread ou un script.
+    Le modèle reste chargé à la fin: start_build le libère une fois la tâche terminée
+
+    Args:
+        model_name: Modèle sentence-transformers à utiliser
+        progress: Appelée avec (articles traités, total) après chaque lot
+
+    Returns:
+        Le document de la version construite
+    """
+    model = vector_search.get_model(model_name)
+    dimension = model.get_sentence_embedding_dimension()
+    version_id = make_version_id(model_name, dimension)
+    collection_name = _collection_for(version_id)
+
+    # Ne jamais reconstruire la version servie ni la collection historique
+    versions = db.get_versions_collection()
+    existing = versions.find_one({"_id": version_id}) or {}
+    pointer = versions.find_one({"_id": ACTIVE_POINTER_ID}) or {}
+    if (version_id in (pointer.get("version_id"), vector_index.current_source().get("version_id"))
+            or existing.get("collection") == db.VECTORS_COLLECTION_NAME):
+        raise ValueError(f"La version {version_id} est en cours d'utilisation")
+
+    versions.update_one(
+        {"_id": version_id},
+        {"$set": {"model_name": model_name, "dimension": dimension, "collection": collection_name,
+                  "status": STATUS_BUILDING, "count": 0, "created_at": datetime.utcnow()},
+         "$unset": {"error": "", "built_at": ""}},
+        upsert=True
+    )
+
+    try:
+        target = db.get_database()[collection_name]
+        target.drop()
+        news_collection = db.get_news_collection()
+        total = news_collection.count_documents({})
+        processed = 0
+        inserted = 0
+
+        def flush(items):
+            embeddings = vector_search.generate_embeddings([text for _, _, text in items], model_name=model_name)
+            now = datetime.utcnow()
+            target.insert_many([
+                {"url": url, "language": lang, "text": text, "embedding": embedding.tolist(), "created_at": now}
+                for (url, lang, text), embedding in zip(items, embeddings)
+            ])
+            return len(items)
+
+        items = []
+        for doc in news_collection.find({}, {"url": 1, "title_fr": 1, "title_en": 1}).batch_size(500):
+            for lang in ("fr", "en"):
+                if doc.get(f"title_{lang}"):
+                    items.append((doc.get("url"), lang, doc[f"title_{lang}"]))
+            processed += 1
+            if len(items) >= BUILD_BATCH_SIZE:
+                inserted += flush(items)
+                items = []
+                if progress:
+                    progress(processed, total)
+        if items:
+            inserted += flush(items)
+        if progress:
+            progress(processed, total)
+
+        target.create_index("url")
+        versions.update_one({"_id": version_id},
+                            {"$set": {"status": STATUS_READY, "count": inserted, "built_at": datetime.utcnow()}})
+    except Exception as e:
+        versions.update_one({"_id": version_id}, {"$set": {"status": STATUS_FAILED, "error": str(e)}})
+        raise
+
+    return versions.find_one({"_id": version_id})
+
+
+def start_build(model_name: str) -> Dict[str, Any]:
+    """
+    Lance la construction d'une version en arrière-plan (thread), sans attendre la fin
+    """
+    if vector_index.is_frozen():
+        # Le modèle serait chargé dans un seul worker (copie privée) en plus de celui du parent
+        raise ValueError("Construction indisponible en mode multi-workers partagé: "
+                         "utiliser python3 create_embeddings_new_model.py <modèle>")
+    task = _builds.get(model_name)
+    if task is not None and not task.done():
+        raise ValueError(f"Construction déjà en cours pour {model_name}")
+    task = asyncio.create_task(asyncio.to_thread(build_version, model_name))
+    task.add_done_callback(_report_build)
+    _builds[model_name] = task
+    return {"model_name": model_name, "status": STATUS_BUILDING}
+
+
+def _report_build(task: asyncio.Task) -> None:
+    """
+    Fin d'une construction: le modèle construit n'est libéré qu'ici, une fois la tâche
+    terminée (pendant la construction, _unload_unused le considère comme utilisé)
+    """
+    _unload_unused()
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        print(f"❌ Échec de la construction de la version: {task.exception()}")
+    else:
+        print(f"✅ Version construite: {task.result()['_id']}")
+
+
+def _unload_unused() -> None:
+    """
+    Libère les modèles qui ne sont utilisés ni par la version servie, ni par la précédente, ni par le shadow
+    """
+    in_use = {index.model_name for index in (vector_index.current(), _previous, _shadow) if index is not None}
+    in_use.add(vector_index.current_source().get("model_name"))
+    building = [name for name, task in _builds.items() if not task.done()]
+    for model_name in vector_search.loaded_models():
+        if model_name not in in_use and model_name not in building:
+            vector_search.unload_model(model_name)
+
+
+# -------------------------
+# Bascule, retour arrière, shadow
+# -------------------------
+
+def _get_switch_lock() -> asyncio.Lock:
+    global _switch_lock
+    if _switch_lock is None:
+        _switch_lock = asyncio.Lock()
+    return _switch_lock
+
+
+async def _get_version(version_id: str) -> Dict[str, Any]:
+    version = await db.get_async_versions_collection().find_one({"_id": version_id})
+    if not version or version["_id"] == ACTIVE_POINTER_ID:
+        raise LookupError(f"Version inconnue: {version_id}")
+    if version.get("status") != STATUS_READY:
+        raise ValueError(f"La version {version_id} n'est pas prête (statut: {version.get('status')})")
+    return version
+
+
+async def _load(version: Dict[str, Any]) -> vector_index.VectorIndex:
+    """
+    Charge le modèle et l'index d'une version, sans les installer
+    """
+    model = await asyncio.to_thread(vector_search.get_model, version["model_name"])
+    index = await vector_index.build_index_async(_source(version))
+    if len(index) == 0:
+        raise ValueError(f"La version {version['_id']} ne contient aucun embedding")
+    if index.dimension != model.get_sentence_embedding_dimension():
+        raise ValueError(f"Dimension incohérente pour la version {version['_id']}")
+    return index
+
+
+async def _persist_pointer(version_id: str, previous_version_id: Optional[str]) -> None:
+    await db.get_async_versions_collection().update_one(
+        {"_id": ACTIVE_POINTER_ID},
+        {"$set": {"version_id": version_id, "previous_version_id": previous_version_id,
+                  "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+async def _persist_for_reload(version_id: str, previous_version_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Workers partageant l'index du parent (gunicorn preload): seul le registre est mis à jour.
+    Installer la version dans ce worker créerait une copie privée du modèle et de l'index,
+    et les autres workers continueraient de servir l'ancienne version
+    """
+    await _persist_pointer(version_id, previous_version_id)
+    status = get_status()
+    status["pending"] = version_id
+    status["reload_required"] = "kill -HUP <pid du parent gunicorn>"
+    return status
+
+
+async def activate(version_id: str, persist: bool = True) -> Dict[str, Any]:
+    """
+    Bascule atomique vers une version: le modèle et l'index sont chargés pendant que
+    l'ancienne version continue de servir, puis installés par une seule affectation
+
+    Args:
+        version_id: Version à activer (statut "ready")
+        persist: Enregistrer la bascule dans le registre (False: synchronisation d'un autre worker)
+
+    En mode multi-workers partagé, la version est seulement enregistrée comme active:
+    elle est chargée par le parent au prochain SIGHUP
+    """
+    global _previous, _shadow
+    async with _get_switch_lock():
+        version = await _get_version(version_id)
+        if vector_index.is_frozen():
+            return await _persist_for_reload(version_id, vector_index.current_source().get("version_id"))
+        current = vector_index.current()
+        if current is not None and current.source.get("version_id") == version_id:
+            return get_status()
+
+        if _shadow is not None and _shadow.source.get("version_id") == version_id:
+            index = _shadow
+        else:
+            index = await _load(version)
+
+        _previous = current
+        vector_index.install(index)
+        if _shadow is index:
+            _shadow = None
+
+        if persist:
+            await _persist_pointer(version_id, current.source.get("version_id") if current else None)
+        _unload_unused()
+    return get_status()
+
+
+async def rollback() -> Dict[str, Any]:
+    """
+    Retour à la version précédente (instantané si elle est encore en mémoire)
+    En mode multi-workers partagé, seul le registre est mis à jour (rechargement par SIGHUP)
+    """
+    global _previous
+    async with _get_switch_lock():
+        pointer = await db.get_async_versions_collection().find_one({"_id": ACTIVE_POINTER_ID})
+        if vector_index.is_frozen():
+            previous_id = (pointer or {}).get("previous_version_id")
+            if not previous_id:
+                raise LookupError("Aucune version précédente")
+            await _get_version(previous_id)
+            return await _persist_for_reload(previous_id, pointer.get("version_id"))
+        previous_id = (_previous.source.get("version_id") if _previous is not None
+                       else (pointer or {}).get("previous_version_id"))
+        if not previous_id:
+            raise LookupError("Aucune version précédente")
+
+        if _previous is not None and _previous.source.get("version_id") == previous_id:
+            index = _previous
+        else:
+            index = await _load(await _get_version(previous_id))
+
+        current = vector_index.current()
+        vector_index.install(index)
+        _previous = current
+        await _persist_pointer(previous_id, current.source.get("version_id") if current else None)
+    return get_status()
+
+
+async def start_shadow(version_id: str) -> Dict[str, Any]:
+    """
+    Charge une version candidate et la compare à la version servie sur le trafic réel
+    """
+    global _shadow
+    if vector_index.is_frozen():
+        # Un seul worker chargerait le modèle candidat (copie privée) et ne verrait qu'une partie du trafic
+        raise ValueError("Shadow indisponible en mode multi-workers partagé: utiliser un serveur uvicorn séparé")
+    async with _get_switch_lock():
+        version = await _get_version(version_id)
+        current = vector_index.current()
+        if current is not None and current.source.get("version_id") == version_id:
+            raise ValueError("La version en shadow doit être différente de la version servie")
+        _shadow = await _load(version)
+        _reset_shadow_stats()
+    return get_status()
+
+
+def stop_shadow() -> Dict[str, Any]:
+    """
+    Arrête la comparaison shadow et libère le modèle candidat
+    """
+    global _shadow
+    _shadow = None
+    _unload_unused()
+    return get_status()
+
+
+def submit_shadow(user_text: str, language: str, served_doc: Dict[str, Any], served_score: float) -> None:
+    """
+    Planifie la comparaison d'une requête avec la version shadow (sans retarder la réponse)
+    """
+    shadow = _shadow
+    if shadow is None:
+        return
+    if len(_shadow_tasks) >= SHADOW_MAX_PENDING:
+        _shadow_stats["skipped"] += 1
+        return
+    task = asyncio.create_task(_shadow_compare(shadow, user_text, language, served_doc.get("url"), served_score))
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
+
+
+async def _shadow_compare(shadow: vector_index.VectorIndex, user_text: str, language: str,
+                          served_url: Optional[str], served_score: float) -> None:
+    try:
+        def score():
+            # Même politique d'entrée que la version servie (découpage des textes longs)
+            embedding = vector_search.encode_query(user_text, shadow.model_name)
+            return vector_search.rank_candidates(shadow, embedding, user_text, language)
+
+        candidate = await asyncio.to_thread(score)
+        if shadow is not _shadow:
+            return
+        _shadow_stats["compared"] += 1
+        if candidate is None:
+            return
+        if candidate.get("url") == served_url:
+            _shadow_stats["same_article"] += 1
+        _shadow_stats["abs_score_delta_sum"] += abs(candidate.get("score_final", 0.0) - served_score)
+    except Exception:
+        _shadow_stats["errors"] += 1
+
+
+async def watch_active_version() -> None:
+    """
+    Suit la version active du registre (bascule faite par un autre worker)
+    Désactivé pour les workers partageant l'index du parent: SIGHUP recharge la version active
+    """
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL_SECONDS)
+        if vector_index.is_frozen():
+            continue
+        try:
+            pointer = await db.get_async_versions_collection().find_one({"_id": ACTIVE_POINTER_ID})
+            if pointer and pointer["version_id"] != vector_index.current_source().get("version_id"):
+                await activate(pointer["version_id"], persist=False)
+        except Exception as e:
+            print(f"⚠️  Erreur lors de la synchronisation de la version active: {e}")
+
+
+async def list_versions() -> List[Dict[str, Any]]:
+    """
+    Liste les versions du registre
+    """
+    cursor = db.get_async_versions_collection().find({"_id": {"$ne": ACTIVE_POINTER_ID}})
+    return await cursor.to_list(length=None)
+
+
+def get_status() -> Dict[str, Any]:
+    """
+    État des versions dans ce processus (servie, précédente, shadow, constructions en cours)
+    """
+    def version_id(index):
+        return index.source.get("version_id") if index is not None else None
+
+    compared = _shadow_stats["compared"]
+    return {
+        "active": version_id(vector_index.current()),
+        "previous": version_id(_previous),
+        "shadow": version_id(_shadow),
+        "shadow_stats": {
+            "compared": compared,
+            "same_article_rate": round(_shadow_stats["same_article"] / compared, 4) if compared else None,
+            "mean_abs_score_delta": round(_shadow_stats["abs_score_delta_sum"] / compared, 4) if compared else None,
+            "skipped": _shadow_stats["skipped"],
+            "errors": _shadow_stats["errors"],
+        },
+        "building": [name for name, task in _builds.items() if not task.done()],
+        "loaded_models": vector_search.loaded_models(),
+    }
@@ -0,0 +1,50 @@
+"""
+Configuration gunicorn pour le mode multi-workers
+Le modèle et l'index sont chargés une seule fois dans le processus parent
+puis partagés par les workers (voir worker_sharing.py)
+
+Usage:
+    python3 -m gunicorn main:app -c gunicorn_conf.py
+"""
+import os
+import worker_sharing
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+
+# Charger l'application (et donc le modèle/l'index) avant le fork des workers
+preload_app = True
+
+
+def on_starting(server):
+    """
+    Processus parent, avant la création des workers
+    """
+    worker_sharing.preload_in_parent()
+
+
+def on_reload(server):
+    """
+    SIGHUP: recharger l'index dans le parent, les nouveaux workers en héritent
+    """
+    worker_sharing.preload_in_parent()
+
+
+def post_fork(server, worker):
+    """
+    Dans chaque worker, juste après le fork
+    """
+    worker_sharing.after_fork(server.cfg.workers)
+
+
+def post_worker_init(worker):
+    """
+    Dans chaque worker, une fois l'application initialisée
+    """
+    stats = worker_sharing.get_memory_stats()
+    worker.log.info(
+        "Worker %s: RSS %s Mo, PSS %s Mo, partagé %s Mo, privé %s Mo",
+        stats["pid"], stats.get("rss_mb"), stats.get("pss_mb"), stats.get("shared_mb"), stats.get("private_mb")
+    )
@@ -0,0 +1,146 @@
+"""
+Module de politique d'entrée pour l'encodage
+Les textes soumis vont d'un simple titre à un article complet:
+- Limite dure en caractères (au-delà, le texte est coupé sur une frontière de mot)
+- Découpage en morceaux de phrases qui tiennent dans la longueur maximale du modèle
+  (au lieu d'une troncature silencieuse), chaque morceau est comparé au corpus
+  et les scores sont agrégés (max ou moyenne)
+- Regroupement par longueur dans les chemins par lot: les textes de longueur voisine
+  sont encodés ensemble, avec une taille de lot adaptée à leur longueur
+"""
+from typing import List, Tuple
+import os
+import re
+
+# Nombre maximum de caractères analysés
+MAX_INPUT_CHARS = int(os.getenv("MAX_INPUT_CHARS", "5000"))
+
+# Nombre maximum de caractères analysés en mode dégradé (surcharge): un seul encodage court
+REDUCED_MAX_INPUT_CHARS = int(os.getenv("REDUCED_MAX_INPUT_CHARS", "1000"))
+
+# Découpage des textes longs en morceaux (sinon: troncature par le modèle)
+CHUNKING_ENABLED = os.getenv("CHUNKING_ENABLED", "1") != "0"
+
+# Agrégation des scores des morceaux: "max" (le meilleur morceau) ou "mean"
+CHUNK_POOLING = os.getenv("CHUNK_POOLING", "max")
+
+# Nombre maximum de morceaux par texte
+MAX_CHUNKS = 16
+
+# Estimation du nombre de caractères par token (regroupement par longueur)
+CHARS_PER_TOKEN = 4
+
+# Bornes (en tokens estimés) des tranches de longueur pour l'encodage par lot
+LENGTH_BANDS = (16, 32, 64, 128, 256, 512)
+
+# Budget de tokens par lot: les tranches courtes utilisent de grands lots, les longues de petits lots
+TOKENS_PER_BATCH = 4096
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def cap_text(text: str, max_chars: int = MAX_INPUT_CHARS) -> str:
+    """
+    Applique la limite dure en caractères (coupure sur une frontière de mot)
+    """
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip()
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def count_tokens(model, text: str) -> int:
+    """
+    Nombre de tokens du texte pour le modèle (estimation si le tokenizer n'est pas disponible)
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.tokenize(text))
+
+
+def max_tokens(model) -> int:
+    """
+    Longueur maximale d'un morceau en tokens (hors tokens spéciaux)
+    """
+    max_seq_length = getattr(model, "max_seq_length", None) or 256
+    return max(8, max_seq_length - 2)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_SPLIT.split(text) if sentence and sentence.strip()]
+
+
+def chunk_text(text: str, model) -> List[str]:
+    """
+    Découpe un texte en morceaux de phrases entières tenant dans la longueur maximale du modèle
+
+    Args:
+        text: Texte (déjà limité par cap_text)
+        model: Modèle sentence-transformers (tokenizer et max_seq_length)
+
+    Returns:
+        Liste de morceaux (un seul élément si le texte tient en entier ou si le découpage est désactivé)
+    """
+    budget = max_tokens(model)
+    if not CHUNKING_ENABLED or count_tokens(model, text) <= budget:
+        return [text]
+
+    pieces: List[Tuple[str, int]] = []
+    for sentence in split_sentences(text):
+        tokens = count_tokens(model, sentence)
+        if tokens <= budget:
+            pieces.append((sentence, tokens))
+            continue
+        # Phrase trop longue: fenêtres de mots
+        words = sentence.split()
+        window = max(1, len(words) * budget // tokens)
+        for start in range(0, len(words), window):
+            part = " ".join(words[start:start + window])
+            pieces.append((part, count_tokens(model, part)))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece, tokens in pieces:
+        if current and current_tokens + tokens > budget:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+
+    return chunks[:MAX_CHUNKS] or [text]
+
+
+def length_band(text: str) -> int:
+    """
+    Tranche de longueur (borne en tokens estimés) d'un texte
+    """
+    tokens = estimate_tokens(text)
+    for band in LENGTH_BANDS:
+        if tokens <= band:
+            return band
+    return LENGTH_BANDS[-1]
+
+
+def length_buckets(texts: List[str], max_batch_size: int = 128) -> List[Tuple[List[int], int]]:
+    """
+    Regroupe les textes par tranche de longueur
+
+    Returns:
+        Liste de (indices des textes de la tranche, taille de lot adaptée à la tranche)
+    """
+    buckets = {}
+    for i, text in enumerate(texts):
+        buckets.setdefault(length_band(text), []).append(i)
+    return [(indices, max(1, min(max_batch_size, TOKENS_PER_BATCH // band)))
+            for band, indices in sorted(buckets.items())]
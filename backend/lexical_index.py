@@ -0,0 +1,147 @@
+"""
+Index inversé BM25 sur les textes de wydad_vector
+Apporte un signal lexical dès la sélection des candidats: les correspondances exactes
+(noms de joueurs, clubs) mal classées par la similarité cosinus sont retrouvées par BM25,
+puis fusionnées avec les candidats vectoriels (reciprocal rank fusion) avant le re-ranking.
+
+La tokenisation et les mots vides sont les mêmes que pour le score de chevauchement de mots-clés
+"""
+from typing import List, Dict, Tuple, Iterable, Optional
+from collections import Counter
+import math
+import re
+import numpy as np
+
+# Mots vides (communs au score de mots-clés et à BM25)
+STOPWORDS = {'le', 'la', 'les', 'de', 'du', 'des', 'et', 'ou', 'a', 'à',
+             'un', 'une', 'pour', 'avec', 'dans', 'sur', 'the', 'a', 'an',
+             'and', 'or', 'for', 'with', 'in', 'on', 'at', 'to', 'of'}
+
+# Paramètres BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Nombre de candidats BM25 fusionnés avec les candidats vectoriels
+LEXICAL_TOP_K = 20
+
+# Constante de la reciprocal rank fusion (60 est la valeur usuelle)
+RRF_K = 60
+
+# Nombre maximum de candidats après fusion (re-rankés ensuite)
+FUSED_CANDIDATES = 30
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenise un texte en mots-clés (minuscules, plus de 2 caractères, sans mots vides)
+    """
+    words = re.findall(r'\b\w+\b', text.lower())
+    return [w for w in words if len(w) > 2 and w not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Index inversé: terme -> (lignes, fréquences), lignes alignées sur celles de VectorIndex
+    Les listes de postings sont des tableaux NumPy jamais modifiés: un ajout crée de nouveaux
+    tableaux pour les seuls termes concernés (l'ancien index reste utilisable)
+    """
+
+    def __init__(self, texts: Iterable[str] = ()):
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self._add(list(texts))
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def _add(self, texts: List[str]) -> None:
+        start = len(self.doc_lengths)
+        new_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = []
+        for offset, text in enumerate(texts):
+            tokens = tokenize(text or "")
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                rows, tfs = new_postings.setdefault(term, ([], []))
+                rows.append(start + offset)
+                tfs.append(count)
+
+        for term, (rows, tfs) in new_postings.items():
+            rows = np.asarray(rows, dtype=np.int32)
+            tfs = np.asarray(tfs, dtype=np.float32)
+            if term in self.postings:
+                old_rows, old_tfs = self.postings[term]
+                rows = np.concatenate([old_rows, rows])
+                tfs = np.concatenate([old_tfs, tfs])
+            self.postings[term] = (rows, tfs)
+        self.doc_lengths = np.concatenate([self.doc_lengths, np.asarray(lengths, dtype=np.float32)])
+
+    def extended(self, texts: List[str]) -> "LexicalIndex":
+        """
+        Retourne un nouvel index contenant les textes ajoutés (mise à jour incrémentale:
+        seuls les nouveaux textes sont tokenisés)
+        """
+        index = LexicalIndex()
+        index.postings = dict(self.postings)
+        index.doc_lengths = self.doc_lengths
+        index._add(texts)
+        return index
+
+    def scores(self, query_text: str) -> Optional[np.ndarray]:
+        """
+        Scores BM25 de toutes les lignes pour la requête
+
+        Returns:
+            Tableau de scores (0 pour les lignes sans terme commun), None si aucun terme connu
+        """
+        terms = [term for term in set(tokenize(query_text)) if term in self.postings]
+        if not terms or len(self) == 0:
+            return None
+
+        n_docs = len(self)
+        avg_length = float(self.doc_lengths.mean()) or 1.0
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in terms:
+            rows, tfs = self.postings[term]
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = tfs + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[rows] / avg_length)
+            scores[rows] += idf * tfs * (BM25_K1 + 1) / norm
+        return scores
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> List[int]:
+    """
+    Fusionne plusieurs classements de lignes (reciprocal rank fusion)
+
+    Args:
+        rankings: Listes de lignes, chacune triée du meilleur au moins bon
+        k: Constante RRF (atténue l'écart entre les premiers rangs)
+
+    Returns:
+        Lignes triées par score RRF décroissant
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+def fuse_candidates(vector_rows: List[int], lexical_rows: List[int],
+                    limit: int = FUSED_CANDIDATES) -> List[int]:
+    """
+    Candidats à re-ranker: fusion RRF des candidats cosinus et BM25, limitée à limit lignes
+    Le meilleur candidat cosinus est toujours conservé
+
+    Args:
+        vector_rows: Lignes triées par score cosinus décroissant
+        lexical_rows: Lignes triées par score BM25 décroissant
+        limit: Nombre maximum de candidats
+
+    Returns:
+        Lignes triées par score RRF décroissant
+    """
+    rows = reciprocal_rank_fusion([vector_rows, lexical_rows])[:max(1, limit)]
+    if vector_rows and vector_rows[0] not in rows:
+        rows[-1] = vector_rows[0]
+    return rows
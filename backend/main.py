@@ -2,11 +2,23 @@
 Application FastAPI principale
 Endpoint pour l'analyse de fausses nouvelles
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File, Query, Header, Depends
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+import asyncio
+import hmac
+import os
 import vector_search
+import vector_index
+import bulk_analysis
+import worker_sharing
+import admission
+import semantic_cache
+import embedding_versions
+import input_policy
 import db
 
 # Initialisation de l'application FastAPI
@@ -26,11 +38,34 @@ app.add_middleware(
 )
 
 
+# Jeton d'administration des versions d'embeddings (en-tête X-Admin-Token)
+# Sans jeton configuré, l'administration n'est accessible que depuis la machine locale
+# Jeton des routes d'administration des versions: sans jeton, ces routes sont désactivées
+# (l'adresse du client ne suffit pas: derrière un proxy local, toutes les requêtes viennent de 127.0.0.1)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Protège les routes qui construisent, activent ou comparent des versions d'embeddings
+    (téléchargement de modèle, ré-encodage du corpus, changement du modèle servi)
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Administration des versions désactivée (définir ADMIN_TOKEN)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide")
+
+
 # Modèle de requête
 class AnalyzeRequest(BaseModel):
     text: str
 
 
+# Modèle de requête pour la construction d'une version d'embeddings
+class BuildVersionRequest(BaseModel):
+    model_name: str
+
+
 # Modèle de réponse
 class AnalyzeResponse(BaseModel):
     verdict: str
@@ -38,6 +73,8 @@ class AnalyzeResponse(BaseModel):
     closest_article: str
     source_url: str
     language: str
+    # Mode dégradé appliqué sous charge ("reduced": texte analysé tronqué), None sinon
+    degraded: Optional[str] = None
 
 
 def get_verdict(score: float) -> str:
@@ -71,13 +108,32 @@ async def root():
     }
 
 
+@app.get("/stats")
+async def stats() -> Dict[str, Any]:
+    """
+    Statistiques de fonctionnement (pool MongoDB, index vectoriel, admission, cache, mémoire du worker)
+    """
+    return {
+        "mongo_pool": db.get_pool_stats(),
+        "admission": admission.controller.snapshot(),
+        "semantic_cache": semantic_cache.cache.snapshot(),
+        "vector_index": vector_index.get_index_stats(),
+        "worker": worker_sharing.get_memory_stats(),
+    }
+
+
 @app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_text(request: AnalyzeRequest) -> AnalyzeResponse:
+async def analyze_text(request: AnalyzeRequest, response: Response) -> AnalyzeResponse:
     """
     Analyse un texte pour détecter s'il s'agit de fausses nouvelles
     
+    Le nombre de requêtes traitées simultanément est limité (voir admission.py):
+    en cas de surcharge, la requête est rejetée immédiatement (503 + Retry-After)
+    
     Args:
         request: Objet contenant le texte à analyser
+        response: Réponse HTTP (en-tête X-Degraded-Mode si un mode dégradé est appliqué,
+            également indiqué dans le champ degraded)
         
     Returns:
         Réponse avec le verdict, le score, l'article le plus proche, etc.
@@ -90,31 +146,47 @@ async def analyze_text(request: AnalyzeRequest) -> AnalyzeResponse:
                 detail="Le texte ne peut pas être vide"
             )
         
-        user_text = request.text.strip()
+        # Limite dure en caractères (les textes très longs ne sont pas analysés en entier)
+        user_text = input_policy.cap_text(request.text.strip())
         
         # Détecter la langue du texte
         language = vector_search.detect_language(user_text)
         
         # Trouver l'article le plus proche (avec filtre de langue pour plus de précision)
-        closest_doc, score = vector_search.find_closest_article(user_text, language=language)
-        
-        # Déterminer le verdict basé sur le score final hybride
-        # Le score est déjà entre 0 et 1 (score hybride)
-        display_score = max(0.0, min(1.0, score))
+        deadline = admission.Deadline(admission.REQUEST_DEADLINE_SECONDS)
+        async with admission.controller.admit(deadline) as mode:
+            if mode != admission.MODE_NORMAL:
+                response.headers["X-Degraded-Mode"] = mode
+            closest_doc, score = await vector_search.find_closest_article_async(
+                user_text,
+                language=language,
+                deadline=deadline,
+                reduced=mode == admission.MODE_REDUCED,
+                cache_only=mode == admission.MODE_CACHE_ONLY
+            )
         
-        verdict = get_verdict(display_score)
+        # Déterminer le verdict basé sur le score final hybride et construire la réponse
+        result = build_result(score, closest_doc, language)
+        if mode != admission.MODE_NORMAL:
+            result["degraded"] = mode
+        return AnalyzeResponse(**result)
         
-        # Construire la réponse
-        response = AnalyzeResponse(
-            verdict=verdict,
-            score=round(display_score, 4),  # Score final hybride arrondi à 4 décimales
-            closest_article=closest_doc.get("text", ""),
-            source_url=closest_doc.get("url", ""),
-            language=language
+    except HTTPException:
+        raise
+    except admission.Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
-        
-        return response
-        
+    except semantic_cache.CacheMiss as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(admission.controller.retry_after())}
+        )
+    except admission.DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -124,20 +196,162 @@ async def analyze_text(request: AnalyzeRequest) -> AnalyzeResponse:
         )
 
 
+def build_result(score: float, closest_doc: Dict[str, Any], language: str) -> Dict[str, Any]:
+    """
+    Construit les champs de réponse (verdict, score, article) à partir du résultat de recherche
+    """
+    # Le score est déjà entre 0 et 1 (score hybride)
+    display_score = max(0.0, min(1.0, score))
+    return {
+        "verdict": get_verdict(display_score),
+        "score": round(display_score, 4),  # Score final hybride arrondi à 4 décimales
+        "closest_article": closest_doc.get("text", ""),
+        "source_url": closest_doc.get("url", ""),
+        "language": language
+    }
+
+
+@app.post("/analyze/bulk")
+async def analyze_bulk(
+    request: Request,
+    file: UploadFile = File(...),
+    text_field: str = Query(bulk_analysis.DEFAULT_TEXT_FIELD, description="Champ/colonne contenant le texte"),
+    file_format: str = Query(None, alias="format", description="jsonl ou csv (déduit du nom de fichier sinon)"),
+    chunk_size: int = Query(bulk_analysis.DEFAULT_CHUNK_SIZE, ge=1, le=bulk_analysis.MAX_CHUNK_SIZE),
+) -> StreamingResponse:
+    """
+    Analyse en masse d'un fichier JSONL ou CSV
+    
+    Le fichier est traité par blocs de chunk_size lignes et les résultats sont
+    renvoyés en NDJSON au fur et à mesure (une ligne par résultat + lignes de progression).
+    Si le client annule la requête, le traitement s'arrête au bloc suivant.
+    """
+    file_format = file_format or bulk_analysis.detect_format(file.filename, file.content_type)
+    if file_format not in bulk_analysis.SUPPORTED_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail="Format de fichier non supporté (jsonl ou csv attendu)"
+        )
+    
+    # Une seule analyse en masse à la fois (par défaut): le CPU reste disponible pour /analyze
+    release = bulk_analysis.start_job()
+    if release is None:
+        raise HTTPException(
+            status_code=429,
+            detail="Une analyse en masse est déjà en cours, réessayez plus tard",
+            headers={"Retry-After": "30"}
+        )
+    
+    stream = bulk_analysis.stream_analysis(
+        file.file,
+        file_format,
+        analyze=vector_search.find_closest_articles_batch_async,
+        make_result=lambda closest_doc, score, language: build_result(score, closest_doc, language),
+        is_disconnected=request.is_disconnected,
+        text_field=text_field,
+        chunk_size=chunk_size
+    )
+    # Libération à la fin du flux, ou après la réponse si le flux n'a jamais démarré
+    return StreamingResponse(bulk_analysis.release_when_done(stream, release),
+                             media_type="application/x-ndjson",
+                             background=BackgroundTask(release))
+
+
+@app.get("/versions")
+async def get_versions() -> Dict[str, Any]:
+    """
+    Liste les versions d'embeddings (registre) et l'état de ce worker (active, précédente, shadow)
+    """
+    versions: List[Dict[str, Any]] = await embedding_versions.list_versions()
+    return {"versions": versions, "status": embedding_versions.get_status()}
+
+
+@app.post("/versions/build", status_code=202, dependencies=[Depends(require_admin)])
+async def build_version(request: BuildVersionRequest) -> Dict[str, Any]:
+    """
+    Lance la construction d'une nouvelle version en arrière-plan
+    La version servie continue de répondre pendant la construction
+    """
+    if request.model_name not in embedding_versions.ALLOWED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modèle non autorisé (ALLOWED_EMBEDDING_MODELS): {', '.join(embedding_versions.ALLOWED_MODELS)}"
+        )
+    try:
+        return embedding_versions.start_build(request.model_name)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/versions/rollback", dependencies=[Depends(require_admin)])
+async def rollback_version() -> Dict[str, Any]:
+    """
+    Revient à la version précédente
+    """
+    try:
+        return await embedding_versions.rollback()
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.delete("/versions/shadow", dependencies=[Depends(require_admin)])
+async def stop_shadow() -> Dict[str, Any]:
+    """
+    Arrête la comparaison shadow
+    """
+    return embedding_versions.stop_shadow()
+
+
+@app.post("/versions/{version_id}/activate", dependencies=[Depends(require_admin)])
+async def activate_version(version_id: str) -> Dict[str, Any]:
+    """
+    Bascule atomique vers une version (modèle et index installés ensemble)
+    En mode multi-workers partagé: version enregistrée comme active, chargée au prochain SIGHUP
+    """
+    try:
+        return await embedding_versions.activate(version_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/versions/{version_id}/shadow", dependencies=[Depends(require_admin)])
+async def start_shadow(version_id: str) -> Dict[str, Any]:
+    """
+    Compare une version candidate à la version servie sur le trafic réel
+    """
+    try:
+        return await embedding_versions.start_shadow(version_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @app.on_event("startup")
 async def startup_event():
     """
-    Précharge le modèle sentence-transformers au démarrage
+    Précharge le modèle sentence-transformers et l'index vectoriel au démarrage
     pour éviter le délai lors du premier appel
     """
-    print("🔄 Préchargement du modèle sentence-transformers...")
+    print("🔄 Chargement de la version d'embeddings active (modèle + index)...")
     try:
-        # Précharger le modèle pour éviter le délai au premier appel
-        vector_search.get_model()
-        print("✅ Modèle chargé avec succès")
+        # Déjà chargée par le processus parent en mode multi-workers
+        if vector_index.current() is None:
+            await embedding_versions.initialize()
+        index = vector_index.current()
+        print(f"✅ Version {index.source.get('version_id')} chargée: {len(index)} vectorisations")
     except Exception as e:
-        print(f"⚠️  Erreur lors du préchargement du modèle: {e}")
-        print("   Le modèle sera chargé à la demande lors du premier appel")
+        print(f"⚠️  Erreur lors du chargement de la version active: {e}")
+        print("   Le modèle et l'index seront chargés à la demande lors du premier appel")
+    
+    # Suivre les bascules de version faites par les autres workers
+    app.state.version_watcher = asyncio.create_task(embedding_versions.watch_active_version())
+    # Rafraîchir l'index en arrière-plan (les requêtes ne lisent que l'index installé)
+    app.state.index_refresher = asyncio.create_task(vector_index.refresh_periodically())
 
 
 @app.on_event("shutdown")
@@ -145,6 +359,10 @@ async def shutdown_event():
     """
     Ferme la connexion MongoDB à l'arrêt de l'application
     """
+    for name in ("version_watcher", "index_refresher"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
     db.close_connection()
 
 
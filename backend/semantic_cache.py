@@ -0,0 +1,171 @@
+"""
+Module de cache sémantique des requêtes
+Les rumeurs reviennent souvent avec des formulations légèrement différentes:
+si l'embedding d'une nouvelle requête est assez proche (cosinus) de celui d'une
+requête récente de même langue, le résultat mémorisé est réutilisé sans
+recherche dans le corpus ni re-ranking.
+
+- Éviction LRU
+- Invalidation lorsque le corpus (l'index vectoriel) change; les requêtes encore servies
+  par un index plus ancien (en cours pendant une bascule) sont ignorées
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import copy
+import os
+import threading
+import numpy as np
+
+# Nombre de requêtes mémorisées
+CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "1024"))
+
+# Similarité cosinus minimale pour réutiliser un résultat
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+
+class CacheMiss(Exception):
+    """
+    Aucun résultat en cache alors que seules les réponses en cache sont servies (mode dégradé)
+    """
+
+
+class SemanticCache:
+    """
+    Petit index en mémoire des embeddings de requêtes récentes et de leurs résultats
+    """
+
+    def __init__(self, capacity: int = CACHE_CAPACITY, threshold: float = SIMILARITY_THRESHOLD):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None  # capacity x dimension, une ligne par emplacement
+        self._languages = np.full(capacity, "", dtype="U8")
+        self._used = np.zeros(capacity, dtype=bool)
+        self._entries: "OrderedDict[int, Tuple[Dict[str, Any], float]]" = OrderedDict()  # emplacement -> résultat (ordre LRU)
+        self._corpus_version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _clear(self) -> None:
+        self._used[:] = False
+        self._entries.clear()
+
+    def _check_version(self, corpus_version: int, dimension: int) -> bool:
+        """
+        Vide le cache si le corpus est plus récent que celui des entrées
+
+        Returns:
+            False si la requête provient d'un index plus ancien (à ignorer, le cache n'est pas vidé)
+        """
+        if self._corpus_version is not None and corpus_version < self._corpus_version:
+            return False
+        if self._corpus_version != corpus_version:
+            if self._entries:
+                self.invalidations += 1
+            self._clear()
+            self._corpus_version = corpus_version
+        if self._matrix is None or self._matrix.shape[1] != dimension:
+            self._matrix = np.zeros((self.capacity, dimension), dtype=np.float32)
+            self._clear()
+        return True
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            return None
+        return vec / norm
+
+    def lookup(self, embedding, language: str, corpus_version: int,
+               peek: bool = False) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Cherche une requête mémorisée suffisamment proche
+
+        Args:
+            embedding: Embedding de la nouvelle requête
+            language: Langue de la requête (doit être identique)
+            corpus_version: Version de l'index vectoriel utilisé par la requête
+            peek: Consultation sans effet (ni statistiques, ni promotion LRU), pour l'analyse en masse
+
+        Returns:
+            (document, score) mémorisés, ou None
+        """
+        query = self._normalize(embedding)
+        if query is None or self.capacity <= 0:
+            return None
+
+        with self._lock:
+            if not self._check_version(corpus_version, len(query)) or not self._entries:
+                if not peek:
+                    self.misses += 1
+                return None
+
+            scores = self._matrix @ query
+            candidates = self._used & (self._languages == (language or ""))
+            scores = np.where(candidates, scores, -np.inf)
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                if not peek:
+                    self.misses += 1
+                return None
+
+            if not peek:
+                self.hits += 1
+                self._entries.move_to_end(slot)
+            doc, score = self._entries[slot]
+        # Copie: l'appelant peut modifier le document sans altérer le cache
+        return copy.copy(doc), score
+
+    def store(self, embedding, language: str, doc: Dict[str, Any], score: float, corpus_version: int) -> None:
+        """
+        Mémorise le résultat d'une requête (éviction LRU si le cache est plein)
+        """
+        query = self._normalize(embedding)
+        if query is None or self.capacity <= 0:
+            return
+
+        with self._lock:
+            if not self._check_version(corpus_version, len(query)):
+                return
+            if len(self._entries) >= self.capacity:
+                slot, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+            else:
+                slot = int(np.argmin(self._used))
+            self._matrix[slot] = query
+            self._languages[slot] = language or ""
+            self._used[slot] = True
+            self._entries[slot] = (copy.copy(doc), score)
+
+    def invalidate(self) -> None:
+        """
+        Vide le cache (changement de corpus ou de modèle)
+        """
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Statistiques du cache (taux de succès, évictions, invalidations)
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Cache global devant find_closest_article
+cache = SemanticCache()
+
@@ -0,0 +1,16 @@
+#!/bin/bash
+# Script de démarrage du serveur FastAPI en mode multi-workers (gunicorn)
+# Le modèle et l'index sont chargés une seule fois puis partagés par les workers
+
+WORKERS="${WEB_CONCURRENCY:-4}"
+
+echo "🚀 Démarrage du serveur Fake News Detection API ($WORKERS workers)..."
+echo "📡 Le serveur sera accessible sur http://localhost:8000"
+echo "🔁 Recharger l'index: kill -HUP <pid du parent>"
+echo "📊 Mémoire des workers: python3 worker_sharing.py <pid du parent>"
+echo ""
+echo "Appuyez sur Ctrl+C pour arrêter le serveur"
+echo ""
+
+cd "$(dirname "$0")"
+WEB_CONCURRENCY="$WORKERS" python3 -m gunicorn main:app -c gunicorn_conf.py
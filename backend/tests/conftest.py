@@ -0,0 +1,8 @@
+"""
+Configuration des tests unitaires (sans MongoDB ni modèle sentence-transformers)
+Les modules du backend sont importés directement (import vector_index, ...), comme par main.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,61 @@
+"""
+Tests du contrôle d'admission (file bornée, rejet, place gardée pendant un encodage abandonné)
+"""
+import asyncio
+import threading
+import pytest
+import admission
+
+
+def test_queue_full_is_rejected():
+    async def scenario():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1)
+        async with controller.admit(admission.Deadline(5)) as mode:
+            assert mode == admission.MODE_NORMAL
+            with pytest.raises(admission.Overloaded) as error:
+                async with controller.admit(admission.Deadline(5)):
+                    pass
+            assert error.value.retry_after >= 1
+        assert controller.snapshot()["shed_queue_full"] == 1
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_times_out():
+    async def scenario():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        async with controller.admit(admission.Deadline(5)):
+            with pytest.raises(admission.Overloaded):
+                async with controller.admit(admission.Deadline(5)):
+                    pass
+        assert controller.snapshot()["shed_queue_timeout"] == 1
+        assert controller.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_held_until_abandoned_work_finishes():
+    async def scenario():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=1)
+        release = threading.Event()
+        deadline = admission.Deadline(0.05)
+
+        with pytest.raises(admission.DeadlineExceeded):
+            async with controller.admit(deadline):
+                work = asyncio.ensure_future(asyncio.to_thread(release.wait, 5))
+                deadline.hold_until(work)
+                try:
+                    await asyncio.wait_for(asyncio.shield(work), deadline.remaining())
+                except asyncio.TimeoutError:
+                    raise admission.DeadlineExceeded("encodage")
+
+        # La requête a expiré mais le thread tourne encore: la place reste occupée
+        assert controller.in_flight == 1
+        release.set()
+        await work
+        await asyncio.sleep(0)
+        assert controller.in_flight == 0
+        assert controller.snapshot()["abandoned_encodes"] == 1
+
+    asyncio.run(scenario())
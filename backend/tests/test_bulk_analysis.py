@@ -0,0 +1,134 @@
+"""
+Tests de l'analyse en masse (lecture des lignes, erreurs par ligne, bilan final, limite de jobs)
+"""
+import asyncio
+import io
+import json
+import bulk_analysis
+
+
+def records(content, file_format, text_field="text"):
+    fileobj = io.BytesIO(content.encode("utf-8"))
+    return [record for chunk in bulk_analysis.iter_record_chunks(fileobj, file_format, text_field, chunk_size=2)
+            for record in chunk]
+
+
+def test_jsonl_invalid_lines_are_reported_and_reading_continues():
+    content = "\n".join([
+        '{"id": 1, "text": "Le Wydad gagne"}',
+        '{"text": "pas fermé"',
+        '["un", "tableau"]',
+        '{"id": 4}',
+        '{"id": 5, "text": "   "}',
+        '',
+        '{"post_id": "p6", "text": "Victoire au derby"}',
+    ])
+    result = records(content, "jsonl")
+
+    assert [record["line"] for record in result] == [1, 2, 3, 4, 5, 7]
+    assert result[0]["error"] is None and result[0]["text"] == "Le Wydad gagne" and result[0]["id"] == "1"
+    assert result[1]["error"].startswith("JSON invalide")
+    assert result[2]["error"] == "La ligne doit être un objet JSON"
+    assert "absent ou vide" in result[3]["error"] and result[3]["id"] == "4"
+    assert "absent ou vide" in result[4]["error"]
+    assert result[5]["error"] is None and result[5]["id"] == "p6"
+
+
+def test_records_are_grouped_in_chunks():
+    content = "\n".join(json.dumps({"text": f"texte {i}"}) for i in range(5))
+    chunks = list(bulk_analysis.iter_record_chunks(io.BytesIO(content.encode("utf-8")), "jsonl", chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_csv_text_field_and_missing_column():
+    content = "id,message\n1,Le Wydad gagne\n2,\n"
+    result = records(content, "csv", text_field="message")
+    assert [record["error"] is None for record in result] == [True, False]
+    assert records(content, "csv", text_field="text")[0]["error"] == "Champ 'text' absent ou vide"
+
+
+def test_csv_oversized_cell_is_reported_and_reading_continues():
+    huge = "x" * (bulk_analysis.MAX_CSV_FIELD_SIZE + 1)
+    content = f"id,text\n1,{huge}\n2,Victoire au derby\n"
+    result = records(content, "csv")
+
+    assert result[0]["error"].startswith("CSV invalide")
+    assert result[-1]["error"] is None and result[-1]["text"] == "Victoire au derby"
+
+
+def test_csv_unterminated_quote_is_reported():
+    content = 'id,text\n1,Le Wydad gagne\n2,"pas fermé\n'
+    result = records(content, "csv")
+
+    assert result[0]["error"] is None
+    assert result[-1]["error"].startswith("CSV invalide")
+
+
+async def fake_analyze(texts):
+    # Pas de résultat pour les textes contenant "inconnu"
+    return [(None, 0.0, "fr") if "inconnu" in text else ({"title": text}, 0.9, "fr") for text in texts]
+
+
+def run_stream(content, file_format="jsonl", disconnect_after=None):
+    calls = {"n": 0}
+
+    async def is_disconnected():
+        calls["n"] += 1
+        return disconnect_after is not None and calls["n"] > disconnect_after
+
+    async def collect():
+        stream = bulk_analysis.stream_analysis(io.BytesIO(content.encode("utf-8")), file_format,
+                                               analyze=fake_analyze,
+                                               make_result=lambda doc, score, language: {"title": doc["title"]},
+                                               is_disconnected=is_disconnected, chunk_size=2)
+        return [json.loads(line) for part in [p async for p in stream] for line in part.splitlines()]
+
+    return asyncio.run(collect())
+
+
+def test_stream_emits_summary_despite_invalid_lines():
+    content = "\n".join(['{"text": "Le Wydad gagne"}', 'pas du json', '{"text": "inconnu"}', '{"id": 4}'])
+    lines = run_stream(content)
+
+    by_type = {}
+    for line in lines:
+        by_type.setdefault(line["type"], []).append(line)
+    assert [line["line"] for line in by_type["result"]] == [1]
+    assert [line["line"] for line in by_type["error"]] == [2, 3, 4]
+    assert lines[-1]["type"] == "summary"
+    assert lines[-1]["status"] == "completed"
+    assert (lines[-1]["processed"], lines[-1]["errors"]) == (4, 3)
+
+
+def test_stream_emits_summary_when_client_disconnects():
+    content = "\n".join(json.dumps({"text": f"texte {i}"}) for i in range(6))
+    lines = run_stream(content, disconnect_after=1)
+
+    assert lines[-1] == {"type": "summary", "status": "cancelled", "processed": 2, "errors": 0}
+
+
+def test_job_limit_and_idempotent_release(monkeypatch):
+    monkeypatch.setattr(bulk_analysis, "MAX_CONCURRENT_JOBS", 1)
+    monkeypatch.setattr(bulk_analysis, "_running_jobs", 0)
+
+    release = bulk_analysis.start_job()
+    assert release is not None
+    assert bulk_analysis.start_job() is None
+
+    async def stream():
+        yield "ligne\n"
+        raise RuntimeError("échec")
+
+    async def consume():
+        try:
+            async for _ in bulk_analysis.release_when_done(stream(), release):
+                pass
+        except RuntimeError:
+            pass
+
+    asyncio.run(consume())
+    assert bulk_analysis.running_jobs() == 0
+    # Second appel (tâche de fond de la réponse): sans effet
+    release()
+    assert bulk_analysis.running_jobs() == 0
+    assert bulk_analysis.start_job() is not None
@@ -0,0 +1,128 @@
+"""
+Tests du registre des versions d'embeddings (identifiants, garde-fous, mode multi-workers partagé)
+Ni MongoDB ni modèle: les collections et le modèle sont remplacés par des objets factices
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import db
+import embedding_versions
+import vector_index
+import vector_search
+
+
+class FakeModel:
+    def get_sentence_embedding_dimension(self):
+        return 384
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = {doc["_id"]: dict(doc) for doc in documents}
+        self.updates = []
+
+    def find_one(self, query):
+        return self.documents.get(query["_id"])
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append((query, update))
+
+
+class FakeAsyncCollection(FakeCollection):
+    async def find_one(self, query):
+        return super().find_one(query)
+
+
+@pytest.fixture
+def frozen(monkeypatch):
+    persisted = []
+
+    async def fake_get_version(version_id):
+        return {"_id": version_id, "model_name": "modele", "collection": "c", "status": "ready"}
+
+    async def fake_persist_pointer(version_id, previous_version_id):
+        persisted.append((version_id, previous_version_id))
+
+    def no_install(index):
+        raise AssertionError("aucune installation en mode partagé")
+
+    monkeypatch.setattr(vector_index, "is_frozen", lambda: True)
+    monkeypatch.setattr(vector_index, "current_source", lambda: {"version_id": "v1", "model_name": "modele"})
+    monkeypatch.setattr(vector_index, "install", no_install)
+    monkeypatch.setattr(embedding_versions, "_get_version", fake_get_version)
+    monkeypatch.setattr(embedding_versions, "_persist_pointer", fake_persist_pointer)
+    monkeypatch.setattr(embedding_versions, "_switch_lock", None)
+    return persisted
+
+
+def test_make_version_id_normalizes_model_name():
+    assert embedding_versions.make_version_id("sentence-transformers/all-MiniLM-L6-v2", 384) == \
+        "sentence-transformers-all-minilm-l6-v2-384"
+    assert embedding_versions.make_version_id("  Modèle_Test ", 768) == "mod-le-test-768"
+
+
+@pytest.mark.parametrize("documents, source", [
+    # Version désignée par le pointeur du registre
+    ([{"_id": embedding_versions.ACTIVE_POINTER_ID, "version_id": "modele-384"}], {}),
+    # Version servie par ce processus
+    ([], {"version_id": "modele-384"}),
+    # Collection historique wydad_vector
+    ([{"_id": "modele-384", "collection": db.VECTORS_COLLECTION_NAME}], {}),
+])
+def test_build_refuses_version_in_use(monkeypatch, documents, source):
+    versions = FakeCollection(documents)
+    monkeypatch.setattr(vector_search, "get_model", lambda name=None: FakeModel())
+    monkeypatch.setattr(db, "get_versions_collection", lambda: versions)
+    monkeypatch.setattr(vector_index, "current_source", lambda: source)
+
+    with pytest.raises(ValueError):
+        embedding_versions.build_version("modele")
+    assert versions.updates == []
+
+
+def test_frozen_activate_only_writes_pointer(frozen):
+    status = asyncio.run(embedding_versions.activate("v2"))
+    assert frozen == [("v2", "v1")]
+    assert status["pending"] == "v2"
+    assert "kill -HUP" in status["reload_required"]
+
+
+def test_frozen_rollback_only_writes_pointer(frozen, monkeypatch):
+    pointer = {"_id": embedding_versions.ACTIVE_POINTER_ID, "version_id": "v2", "previous_version_id": "v1"}
+    monkeypatch.setattr(db, "get_async_versions_collection", lambda: FakeAsyncCollection([pointer]))
+
+    status = asyncio.run(embedding_versions.rollback())
+    assert frozen == [("v1", "v2")]
+    assert status["pending"] == "v1"
+
+
+def test_frozen_refuses_shadow_and_build(frozen):
+    with pytest.raises(ValueError):
+        asyncio.run(embedding_versions.start_shadow("v2"))
+    with pytest.raises(ValueError, match="create_embeddings_new_model"):
+        embedding_versions.start_build("modele")
+    assert frozen == []
+
+
+def test_finished_build_unloads_its_model(monkeypatch):
+    unloaded = []
+    monkeypatch.setattr(vector_search, "loaded_models", lambda: ["servi", "construit", "en-cours"])
+    monkeypatch.setattr(vector_search, "unload_model", unloaded.append)
+    monkeypatch.setattr(vector_index, "current", lambda: None)
+    monkeypatch.setattr(vector_index, "current_source", lambda: {"model_name": "servi"})
+    monkeypatch.setattr(embedding_versions, "_builds", {})
+
+    async def scenario():
+        running = asyncio.Event()
+        in_progress = asyncio.create_task(running.wait())
+        finished = asyncio.create_task(asyncio.sleep(0, result={"_id": "construit-384"}))
+        embedding_versions._builds.update({"en-cours": in_progress, "construit": finished})
+        await finished
+        embedding_versions._report_build(finished)
+        running.set()
+        await in_progress
+
+    asyncio.run(scenario())
+    assert unloaded == ["construit"]
@@ -0,0 +1,55 @@
+"""
+Tests de la politique d'entrée (limite en caractères, découpage, regroupement par longueur)
+"""
+import input_policy
+
+
+class WordModel:
+    """
+    Modèle factice: un token par mot
+    """
+    max_seq_length = 12
+
+    class tokenizer:
+        @staticmethod
+        def tokenize(text):
+            return text.split()
+
+
+def test_cap_text_cuts_on_word_boundary():
+    text = "mot " * 100
+    capped = input_policy.cap_text(text, max_chars=42)
+    assert len(capped) <= 42
+    assert capped.endswith("mot")
+    assert input_policy.cap_text("court", max_chars=42) == "court"
+
+
+def test_chunk_text_keeps_short_text_whole():
+    assert input_policy.chunk_text("Le Wydad gagne.", WordModel) == ["Le Wydad gagne."]
+
+
+def test_chunk_text_splits_on_sentences_within_budget():
+    sentences = ["Le Wydad gagne le derby.", "Ziyech marque deux buts.", "Le stade est plein ce soir."]
+    chunks = input_policy.chunk_text(" ".join(sentences * 3), WordModel)
+    budget = input_policy.max_tokens(WordModel)
+
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= budget for chunk in chunks)
+    assert " ".join(chunks).split() == " ".join(sentences * 3).split()
+
+
+def test_chunk_text_splits_overlong_sentence():
+    sentence = " ".join(f"mot{i}" for i in range(40))
+    chunks = input_policy.chunk_text(sentence, WordModel)
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= input_policy.max_tokens(WordModel) for chunk in chunks)
+
+
+def test_length_buckets_group_by_band_with_smaller_batches_for_long_texts():
+    texts = ["court", "x" * 2000, "bref", "y" * 400]
+    buckets = input_policy.length_buckets(texts)
+
+    assert sorted(i for indices, _ in buckets for i in indices) == [0, 1, 2, 3]
+    assert buckets[0][0] == [0, 2]
+    sizes = [size for _, size in buckets]
+    assert sizes == sorted(sizes, reverse=True)
@@ -0,0 +1,77 @@
+"""
+Tests de l'index inversé BM25 et de la fusion des candidats
+"""
+import numpy as np
+import lexical_index
+
+TEXTS = [
+    "Ziyech signe au Wydad pour trois saisons",
+    "Le Raja perd le derby contre le Wydad",
+    "Blessure de Amrabat avant le match",
+    "Victoire du Wydad contre le FUS Rabat",
+    "Le Wydad annonce un nouvel entraîneur",
+]
+
+
+def test_tokenize_drops_short_words_and_stopwords():
+    assert lexical_index.tokenize("Le Wydad et la RS Berkane, pour the win!") == ["wydad", "berkane", "win"]
+
+
+def test_scores_rank_rare_term_first():
+    index = lexical_index.LexicalIndex(TEXTS)
+    scores = index.scores("ziyech wydad")
+
+    assert int(np.argmax(scores)) == 0
+    # "wydad" est présent partout sauf dans le texte 2: seul ce texte a un score nul
+    assert scores[2] == 0
+    assert (np.delete(scores, 2) > 0).all()
+
+
+def test_scores_none_without_known_term():
+    index = lexical_index.LexicalIndex(TEXTS)
+    assert index.scores("inconnu totalement") is None
+    assert index.scores("le la de") is None
+    assert lexical_index.LexicalIndex().scores("wydad") is None
+
+
+def test_extended_matches_full_rebuild():
+    base = lexical_index.LexicalIndex(TEXTS[:3])
+    extended = base.extended(TEXTS[3:])
+    full = lexical_index.LexicalIndex(TEXTS)
+
+    assert len(extended) == len(full)
+    for query in ("wydad", "ziyech wydad", "derby raja", "entraîneur", "match blessure"):
+        np.testing.assert_allclose(extended.scores(query), full.scores(query), rtol=1e-6)
+
+
+def test_extended_leaves_original_unchanged():
+    base = lexical_index.LexicalIndex(TEXTS[:3])
+    before = base.scores("wydad").copy()
+    base.extended(TEXTS[3:])
+
+    assert len(base) == 3
+    np.testing.assert_array_equal(base.scores("wydad"), before)
+    assert base.scores("entraîneur") is None
+
+
+def test_reciprocal_rank_fusion_rewards_rows_in_both_rankings():
+    fused = lexical_index.reciprocal_rank_fusion([[1, 2, 3], [3, 4]])
+    assert fused == [3, 1, 2, 4]
+
+
+def test_fuse_candidates_keeps_best_cosine_row():
+    # Les lignes 10..39 sont présentes dans les deux classements et passent devant
+    # la ligne 0, meilleure candidate cosinus mais absente des candidats BM25
+    shared = list(range(10, 40))
+    vector_rows = [0] + shared
+    lexical_rows = shared
+
+    rows = lexical_index.fuse_candidates(vector_rows, lexical_rows, limit=5)
+
+    assert len(rows) == 5
+    assert 0 in rows
+
+
+def test_fuse_candidates_without_lexical_hits():
+    assert lexical_index.fuse_candidates([4, 2, 7], []) == [4, 2, 7]
+    assert lexical_index.fuse_candidates([], []) == []
@@ -0,0 +1,55 @@
+"""
+Tests du cache sémantique (seuil de similarité, LRU, versions du corpus)
+"""
+import numpy as np
+import semantic_cache
+
+
+def vec(*values):
+    return np.asarray(values, dtype=np.float32)
+
+
+def test_near_duplicate_hit_and_language_isolation():
+    cache = semantic_cache.SemanticCache(capacity=4, threshold=0.95)
+    cache.store(vec(1, 0, 0), "fr", {"url": "a"}, 0.8, corpus_version=1)
+
+    assert cache.lookup(vec(1, 0.05, 0), "fr", 1) == ({"url": "a"}, 0.8)
+    assert cache.lookup(vec(1, 0.05, 0), "en", 1) is None
+    assert cache.lookup(vec(0, 1, 0), "fr", 1) is None
+
+
+def test_lru_eviction():
+    cache = semantic_cache.SemanticCache(capacity=2, threshold=0.99)
+    cache.store(vec(1, 0, 0), "fr", {"url": "a"}, 0.1, 1)
+    cache.store(vec(0, 1, 0), "fr", {"url": "b"}, 0.2, 1)
+    cache.lookup(vec(1, 0, 0), "fr", 1)  # "a" devient le plus récent
+    cache.store(vec(0, 0, 1), "fr", {"url": "c"}, 0.3, 1)
+
+    assert cache.lookup(vec(0, 1, 0), "fr", 1) is None
+    assert cache.lookup(vec(1, 0, 0), "fr", 1) is not None
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_newer_corpus_invalidates_older_is_ignored():
+    cache = semantic_cache.SemanticCache(capacity=4)
+    cache.store(vec(1, 0, 0), "fr", {"url": "a"}, 0.8, corpus_version=2)
+
+    # Requête encore servie par l'index précédent: ignorée, le cache n'est pas vidé
+    assert cache.lookup(vec(1, 0, 0), "fr", 1) is None
+    cache.store(vec(0, 1, 0), "fr", {"url": "old"}, 0.5, corpus_version=1)
+    assert cache.lookup(vec(1, 0, 0), "fr", 2) is not None
+    assert cache.lookup(vec(0, 1, 0), "fr", 2) is None
+
+    # Nouveau corpus: cache vidé
+    assert cache.lookup(vec(1, 0, 0), "fr", 3) is None
+    assert cache.snapshot()["invalidations"] == 1
+
+
+def test_peek_has_no_side_effects():
+    cache = semantic_cache.SemanticCache(capacity=4)
+    cache.store(vec(1, 0, 0), "fr", {"url": "a"}, 0.8, 1)
+
+    assert cache.lookup(vec(1, 0, 0), "fr", 1, peek=True) is not None
+    assert cache.lookup(vec(0, 1, 0), "fr", 1, peek=True) is None
+    snapshot = cache.snapshot()
+    assert snapshot["hits"] == 0 and snapshot["misses"] == 0
@@ -0,0 +1,120 @@
+"""
+Tests de l'index vectoriel en mémoire (construction, extension incrémentale, recherche)
+"""
+import asyncio
+import numpy as np
+import pytest
+import vector_index
+
+
+def make_docs(start, count, dimension=8, seed=0):
+    rng = np.random.default_rng(seed + start)
+    words = ["wydad", "raja", "ziyech", "derby", "transfert", "blessure", "victoire", "stade"]
+    return [{
+        "_id": start + i,
+        "url": f"https://example.com/{start + i}",
+        "language": "fr" if (start + i) % 2 else "en",
+        "text": " ".join(rng.choice(words, 4)),
+        "embedding": rng.normal(size=dimension).tolist(),
+    } for i in range(count)]
+
+
+@pytest.fixture
+def docs():
+    return make_docs(0, 50) + make_docs(50, 10)
+
+
+def test_extended_matches_full_rebuild(docs):
+    base = vector_index.VectorIndex(docs[:50])
+    extended = base.extended(docs[50:])
+    full = vector_index.VectorIndex(docs)
+
+    assert extended.ids == full.ids
+    assert extended.last_id == 59
+    np.testing.assert_allclose(extended.matrix, full.matrix)
+    np.testing.assert_array_equal(extended.language_array, full.language_array)
+
+    query = np.asarray(docs[55]["embedding"])
+    assert extended.search(query, limit=5) == full.search(query, limit=5)
+    for text in ("wydad derby", "ziyech", "stade blessure"):
+        lexical = extended.search_lexical(text, limit=10)
+        expected = full.search_lexical(text, limit=10)
+        assert [row for row, _ in lexical] == [row for row, _ in expected]
+        np.testing.assert_allclose([s for _, s in lexical], [s for _, s in expected], rtol=1e-6)
+
+
+def test_extended_is_a_new_version_and_keeps_original(docs):
+    base = vector_index.VectorIndex(docs[:50])
+    extended = base.extended(docs[50:])
+
+    assert extended.version > base.version
+    assert len(base) == 50 and len(base.lexical) == 50
+    assert not base.matrix.flags.writeable and not extended.matrix.flags.writeable
+
+
+def test_extended_skips_other_dimensions(docs):
+    base = vector_index.VectorIndex(docs[:50])
+    extended = base.extended(make_docs(100, 3, dimension=4))
+
+    assert len(extended) == 50
+    assert extended.version > base.version
+
+
+def test_search_lexical_language_filter(docs):
+    index = vector_index.VectorIndex(docs)
+    hits = index.search_lexical("wydad raja", limit=20, language_filter="fr")
+
+    assert hits
+    assert all(index.languages[row] == "fr" for row, _ in hits)
+    assert all(score > 0 for _, score in hits)
+    assert index.search_lexical("inconnu", limit=5) == []
+
+
+def test_similarity_rows_matches_full_scores(docs):
+    index = vector_index.VectorIndex(docs)
+    query = np.asarray(docs[3]["embedding"])
+    rows = [3, 10, 42]
+
+    np.testing.assert_allclose(index.similarity(query, rows=rows), index.similarity(query)[rows], rtol=1e-6)
+    # Texte découpé: agrégation des scores des morceaux
+    chunks = np.stack([docs[3]["embedding"], docs[7]["embedding"]])
+    pooled = index.similarity(chunks, pooling="max")
+    assert pooled[3] == pytest.approx(1.0, abs=1e-5)
+    assert pooled[7] == pytest.approx(1.0, abs=1e-5)
+    assert index.similarity(np.zeros(8)) is None
+    assert index.similarity(np.ones(3)) is None
+
+
+def test_request_path_never_refreshes_installed_index(monkeypatch, docs):
+    index = vector_index.VectorIndex(docs)
+    loads = []
+
+    async def fake_load():
+        loads.append(1)
+
+    monkeypatch.setattr(vector_index, "_index", index)
+    monkeypatch.setattr(vector_index, "_loaded_at", 0.0)  # très ancien
+    monkeypatch.setattr(vector_index, "load_index_async", fake_load)
+
+    assert asyncio.run(vector_index.get_index_async()) is index
+    assert loads == []
+
+
+def test_refresh_runs_in_background_task(monkeypatch):
+    loads = []
+
+    async def fake_load():
+        loads.append(1)
+
+    monkeypatch.setattr(vector_index, "REFRESH_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(vector_index, "_refresh_lock", None)
+    monkeypatch.setattr(vector_index, "load_index_async", fake_load)
+
+    async def scenario():
+        task = asyncio.create_task(vector_index.refresh_periodically())
+        while len(loads) < 2:
+            await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert len(loads) >= 2
@@ -0,0 +1,74 @@
+"""
+Tests de l'analyse d'un texte sous contrôle d'admission (échéance, modes dégradés)
+Le modèle n'est jamais chargé: l'encodage et l'index sont remplacés par des objets factices
+"""
+import asyncio
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("langdetect")
+
+import admission
+import input_policy
+import semantic_cache
+import vector_index
+import vector_search
+
+
+class FakeIndex:
+    model_name = "modele-test"
+    version = 1
+
+
+@pytest.fixture
+def encodes(monkeypatch):
+    calls = []
+
+    def fake_encode(text, model_name=None, chunking=True):
+        calls.append({"text": text, "model_name": model_name, "chunking": chunking})
+        return np.ones(4, dtype=np.float32)
+
+    async def fake_get_index():
+        return FakeIndex()
+
+    monkeypatch.setattr(vector_search, "encode_query", fake_encode)
+    monkeypatch.setattr(vector_index, "get_index_async", fake_get_index)
+    monkeypatch.setattr(semantic_cache, "cache", semantic_cache.SemanticCache())
+    return calls
+
+
+def test_expired_deadline_starts_no_encode(encodes):
+    async def scenario():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=1)
+        deadline = admission.Deadline(0)
+        with pytest.raises(admission.DeadlineExceeded):
+            async with controller.admit(deadline):
+                await vector_search.find_closest_article_async("Le Wydad gagne", "fr", deadline=deadline)
+        await asyncio.sleep(0)
+        assert controller.in_flight == 0
+        assert controller.snapshot()["abandoned_encodes"] == 0
+
+    asyncio.run(scenario())
+    assert encodes == []
+
+
+def test_cache_only_uses_single_capped_encode(encodes):
+    text = "Le Wydad gagne le derby. " * 400
+
+    with pytest.raises(semantic_cache.CacheMiss):
+        asyncio.run(vector_search.find_closest_article_async(text, "fr", cache_only=True))
+
+    assert len(encodes) == 1
+    assert encodes[0]["chunking"] is False
+    assert len(encodes[0]["text"]) <= input_policy.REDUCED_MAX_INPUT_CHARS
+
+
+def test_cache_only_serves_cached_result(encodes):
+    document = {"title": "Victoire au derby", "score_final": 0.9}
+    semantic_cache.cache.store(np.ones(4, dtype=np.float32), "fr", document, 0.9, FakeIndex.version)
+
+    closest, score = asyncio.run(vector_search.find_closest_article_async("Victoire au derby", "fr",
+                                                                           cache_only=True))
+    assert closest["title"] == "Victoire au derby"
+    assert score == 0.9
@@ -0,0 +1,58 @@
+"""
+Tests du partage entre workers (préchargement dans le parent, mesure de la mémoire)
+"""
+import gc
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import db
+import embedding_versions
+import vector_index
+import worker_sharing
+
+
+def test_preload_keeps_only_active_model_and_closes_mongo(monkeypatch):
+    calls = []
+    monkeypatch.setattr(embedding_versions, "initialize_sync", lambda: calls.append("initialize") or [0, 1])
+    monkeypatch.setattr(embedding_versions, "_unload_unused", lambda: calls.append("unload"))
+    monkeypatch.setattr(db, "close_connection", lambda: calls.append("close"))
+
+    try:
+        worker_sharing.preload_in_parent()
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+    assert calls == ["initialize", "unload", "close"]
+
+
+def test_after_fork_freezes_index(monkeypatch):
+    frozen = []
+    monkeypatch.setattr(vector_index, "freeze", lambda: frozen.append(True))
+    monkeypatch.setattr(worker_sharing, "_shared_mode", False)
+    # Sans torch: le nombre de threads de calcul n'est pas modifié dans le processus de test
+    monkeypatch.setitem(sys.modules, "torch", None)
+
+    worker_sharing.after_fork(workers=4)
+    assert frozen == [True]
+    assert worker_sharing.get_memory_stats()["shared_mode"] is True
+
+
+def test_memory_stats_of_current_process():
+    stats = worker_sharing.get_memory_stats()
+    assert stats["pid"] == os.getpid()
+    assert stats.get("rss_mb", stats.get("max_rss_mb", 0)) > 0
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/task"), reason="nécessite /proc (Linux)")
+def test_children_of_current_process():
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        assert child.pid in worker_sharing.get_children(os.getpid())
+    finally:
+        child.kill()
+        child.wait()
+    assert worker_sharing.get_children(2 ** 22 + 1) == []
@@ -0,0 +1,459 @@
+"""
+Index vectoriel en mémoire
+Charge les embeddings de wydad_vector dans une matrice NumPy normalisée
+pour éviter de relire toute la collection à chaque requête.
+L'index est rafraîchi périodiquement par une tâche de fond (chargement asynchrone via Motor),
+jamais dans le chemin d'une requête
+
+Chaque index est lié à une version d'embeddings (collection + modèle, voir embedding_versions.py):
+le modèle et la matrice sont remplacés ensemble par une seule affectation (install)
+
+L'index porte aussi un index inversé BM25 (lexical_index.py) aligné ligne à ligne sur la matrice.
+Entre deux rechargements complets, le rafraîchissement est incrémental: seuls les documents
+ajoutés depuis le dernier chargement sont lus, normalisés et tokenisés
+"""
+from typing import List, Dict, Any, Tuple, Optional
+import asyncio
+import copy
+import itertools
+import time
+import numpy as np
+import db
+import lexical_index
+
+# Intervalle de rafraîchissement de l'index (en secondes)
+REFRESH_INTERVAL_SECONDS = 300
+
+# Intervalle entre deux rechargements complets (prise en compte des suppressions et modifications)
+FULL_REFRESH_INTERVAL_SECONDS = 3600
+
+# Champs lus dans wydad_vector
+VECTOR_PROJECTION = {"_id": 1, "url": 1, "language": 1, "text": 1, "embedding": 1, "created_at": 1}
+
+# Source par défaut: collection historique, modèle par défaut de vector_search
+DEFAULT_SOURCE = {"version_id": None, "model_name": None, "collection": db.VECTORS_COLLECTION_NAME}
+
+# Numéro de version attribué à chaque index construit (invalidation des caches)
+_version_counter = itertools.count(1)
+
+
+def _normalized_matrix(docs: List[Dict[str, Any]]) -> np.ndarray:
+    matrix = np.asarray([doc["embedding"] for doc in docs], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Les vecteurs nuls restent nuls (score 0) au lieu de produire des NaN
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _max_id(ids: List[Any]) -> Any:
+    ids = [doc_id for doc_id in ids if doc_id is not None]
+    try:
+        return max(ids) if ids else None
+    except TypeError:
+        # Types d'_id non comparables: pas de rafraîchissement incrémental
+        return None
+
+
+class VectorIndex:
+    """
+    Matrice d'embeddings normalisés + métadonnées alignées par ligne
+    """
+
+    def __init__(self, docs: List[Dict[str, Any]], source: Dict[str, Any] = None):
+        """
+        Args:
+            docs: Documents de wydad_vector (avec le champ 'embedding')
+            source: Version d'embeddings d'origine {version_id, model_name, collection}
+        """
+        self.source = dict(source or DEFAULT_SOURCE)
+        self.model_name: Optional[str] = self.source.get("model_name")
+
+        # Ne garder que les documents avec un embedding de la dimension majoritaire
+        dims = [len(doc.get("embedding") or []) for doc in docs]
+        self.dimension = max(set(dims), key=dims.count) if dims else 0
+        docs = [doc for doc, dim in zip(docs, dims) if dim and dim == self.dimension]
+
+        self.ids = [doc.get("_id") for doc in docs]
+        self.urls = [doc.get("url") for doc in docs]
+        self.languages = [doc.get("language") for doc in docs]
+        self.texts = [doc.get("text", "") for doc in docs]
+        self.created_at = [doc.get("created_at") for doc in docs]
+
+        self.matrix = _normalized_matrix(docs) if docs else np.zeros((0, 0), dtype=np.float32)
+        # Lecture seule: les pages de la matrice restent partagées entre workers après fork
+        self.matrix.setflags(write=False)
+
+        # Tableau de chaînes fixes (pas d'objets Python, donc pas de compteurs de références modifiés)
+        self.language_array = np.asarray([lang or "" for lang in self.languages], dtype="U8")
+
+        # Index inversé BM25 sur les textes (mêmes lignes que la matrice)
+        self.lexical = lexical_index.LexicalIndex(self.texts)
+
+        # Dernier _id chargé (point de départ du rafraîchissement incrémental)
+        self.last_id = _max_id(self.ids)
+
+        # Change à chaque reconstruction du corpus
+        self.version = next(_version_counter)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def extended(self, docs: List[Dict[str, Any]]) -> "VectorIndex":
+        """
+        Retourne un nouvel index avec les documents ajoutés (l'index actuel n'est pas modifié)
+        Seuls les nouveaux documents sont normalisés et tokenisés
+        """
+        if len(self) == 0:
+            return VectorIndex(docs, self.source)
+
+        docs = [doc for doc in docs if len(doc.get("embedding") or []) == self.dimension]
+        index = copy.copy(self)
+        if docs:
+            index.ids = self.ids + [doc.get("_id") for doc in docs]
+            index.urls = self.urls + [doc.get("url") for doc in docs]
+            index.languages = self.languages + [doc.get("language") for doc in docs]
+            texts = [doc.get("text", "") for doc in docs]
+            index.texts = self.texts + texts
+            index.created_at = self.created_at + [doc.get("created_at") for doc in docs]
+
+            index.matrix = np.vstack([self.matrix, _normalized_matrix(docs)])
+            index.matrix.setflags(write=False)
+            index.language_array = np.concatenate([
+                self.language_array,
+                np.asarray([doc.get("language") or "" for doc in docs], dtype="U8")
+            ])
+            index.lexical = self.lexical.extended(texts)
+            index.last_id = _max_id([self.last_id] + index.ids[len(self):])
+        index.version = next(_version_counter)
+        return index
+
+    def similarity(self, query_embedding: np.ndarray, pooling: str = "max",
+                   rows: List[int] = None) -> Optional[np.ndarray]:
+        """
+        Scores cosinus des lignes pour une requête
+
+        Args:
+            query_embedding: Embedding de la requête, ou matrice (morceaux x dimension) pour un texte découpé
+            pooling: Agrégation des scores des morceaux: "max" ou "mean"
+            rows: Lignes à évaluer, None pour toutes les lignes
+
+        Returns:
+            Vecteur de scores (une valeur par ligne demandée), None si la requête est incompatible ou nulle
+        """
+        queries = np.asarray(query_embedding, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        if len(self) == 0 or queries.ndim != 2 or queries.shape[1] != self.dimension:
+            return None
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        valid = norms[:, 0] > 0
+        queries = queries[valid] / norms[valid]
+        if len(queries) == 0:
+            return None
+
+        matrix = self.matrix if rows is None else self.matrix[np.asarray(rows, dtype=np.intp)]
+        scores = queries @ matrix.T
+        if len(scores) == 1:
+            return scores[0]
+        return scores.mean(axis=0) if pooling == "mean" else scores.max(axis=0)
+
+    def search(self, query_embedding: List[float], limit: int = 20,
+               language_filter: str = None, min_score: float = -1.0) -> List[Tuple[int, float]]:
+        """
+        Recherche les lignes les plus proches par similarité cosinus
+
+        Args:
+            query_embedding: Embedding de la requête
+            limit: Nombre de résultats
+            language_filter: Filtrer par langue ("fr" ou "en"), None pour toutes les langues
+            min_score: Score minimum
+
+        Returns:
+            Liste de (indice de ligne, score cosinus) triée par score décroissant
+        """
+        if len(query_embedding) != self.dimension:
+            return []
+        scores = self.similarity(query_embedding)
+        if scores is None:
+            return []
+        return self.top_k(scores, limit, language_filter, min_score)
+
+    def search_batch(self, query_embeddings: np.ndarray, limit: int = 20,
+                     language_filters: List[Optional[str]] = None,
+                     min_score: float = -1.0) -> List[List[Tuple[int, float]]]:
+        """
+        Recherche par lot: un seul produit matriciel pour toutes les requêtes
+
+        Args:
+            query_embeddings: Matrice (nombre de requêtes x dimension)
+            limit: Nombre de résultats par requête
+            language_filters: Langue de chaque requête (None pour toutes les langues)
+            min_score: Score minimum
+
+        Returns:
+            Pour chaque requête, liste de (indice de ligne, score cosinus)
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if len(self) == 0 or queries.ndim != 2 or queries.shape[1] != self.dimension:
+            return [[] for _ in range(len(queries))]
+        if language_filters is None:
+            language_filters = [None] * len(queries)
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        valid = norms[:, 0] > 0
+        norms[~valid] = 1.0
+        scores = (queries / norms) @ self.matrix.T
+
+        return [self.top_k(scores[i], limit, language_filters[i], min_score) if valid[i] else []
+                for i in range(len(queries))]
+
+    def search_pooled(self, chunk_embeddings: np.ndarray, limit: int = 20, language_filter: str = None,
+                      pooling: str = "max", min_score: float = -1.0) -> List[Tuple[int, float]]:
+        """
+        Recherche pour un texte découpé en morceaux: chaque morceau est comparé au corpus,
+        puis les scores de chaque document sont agrégés sur les morceaux
+
+        Args:
+            chunk_embeddings: Matrice (nombre de morceaux x dimension)
+            limit: Nombre de résultats
+            language_filter: Filtrer par langue ("fr" ou "en"), None pour toutes les langues
+            pooling: "max" (meilleur morceau) ou "mean" (moyenne des morceaux)
+            min_score: Score minimum
+
+        Returns:
+            Liste de (indice de ligne, score agrégé) triée par score décroissant
+        """
+        scores = self.similarity(chunk_embeddings, pooling)
+        if scores is None:
+            return []
+        return self.top_k(scores, limit, language_filter, min_score)
+
+    def search_lexical(self, query_text: str, limit: int = 20,
+                       language_filter: str = None) -> List[Tuple[int, float]]:
+        """
+        Recherche BM25 dans l'index inversé
+
+        Args:
+            query_text: Texte de la requête
+            limit: Nombre de résultats
+            language_filter: Filtrer par langue ("fr" ou "en"), None pour toutes les langues
+
+        Returns:
+            Liste de (indice de ligne, score BM25) triée par score décroissant (lignes sans terme commun exclues)
+        """
+        scores = self.lexical.scores(query_text)
+        if scores is None:
+            return []
+        scores = np.where(scores > 0, scores, -np.inf)
+        return self.top_k(scores, limit, language_filter, min_score=0.0)
+
+    def top_k(self, scores: np.ndarray, limit: int, language_filter: Optional[str],
+               min_score: float) -> List[Tuple[int, float]]:
+        """
+        Sélectionne les top-k lignes d'un vecteur de scores (avec filtre de langue)
+        """
+        if language_filter:
+            scores = np.where(self.language_array == language_filter, scores, -np.inf)
+
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        # argpartition puis tri des seuls top-k
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top
+                if np.isfinite(scores[row]) and scores[row] >= min_score]
+
+    def document(self, row: int, score: float) -> Dict[str, Any]:
+        """
+        Construit le document de résultat pour une ligne (même format que vector_search)
+        """
+        return {
+            "_id": self.ids[row],
+            "score": score,
+            "language": self.languages[row],
+            "text": self.texts[row],
+            "url": self.urls[row],
+            "created_at": self.created_at[row]
+        }
+
+
+# Index global et état de rafraîchissement
+_index: Optional[VectorIndex] = None
+_source: Dict[str, Any] = dict(DEFAULT_SOURCE)
+_loaded_at: float = 0.0
+_full_loaded_at: float = 0.0
+_refresh_lock: Optional[asyncio.Lock] = None
+
+# Index figé: préchargé dans le processus parent et partagé par les workers (pas de rafraîchissement local)
+_frozen: bool = False
+
+
+def _get_refresh_lock() -> asyncio.Lock:
+    global _refresh_lock
+    if _refresh_lock is None:
+        _refresh_lock = asyncio.Lock()
+    return _refresh_lock
+
+
+def freeze() -> None:
+    """
+    Désactive le rafraîchissement périodique dans ce processus
+    Utilisé par les workers qui partagent l'index préchargé par le parent:
+    recharger l'index créerait une copie privée par worker
+    """
+    global _frozen
+    _frozen = True
+
+
+def is_frozen() -> bool:
+    return _frozen
+
+
+def current() -> Optional[VectorIndex]:
+    """
+    Retourne l'index actuellement servi (sans chargement)
+    """
+    return _index
+
+
+def get_model_name() -> Optional[str]:
+    """
+    Modèle de la version d'embeddings actuellement servie (None: modèle par défaut)
+    """
+    return _source.get("model_name")
+
+
+def current_source() -> Dict[str, Any]:
+    """
+    Version d'embeddings actuellement servie {version_id, model_name, collection}
+    """
+    return dict(_source)
+
+
+def install(index: VectorIndex, full: bool = True) -> None:
+    """
+    Remplace l'index servi (et donc la version d'embeddings) de façon atomique
+    Les requêtes en cours gardent leur référence à l'ancien index
+
+    Args:
+        index: Nouvel index
+        full: False si l'index provient d'un rafraîchissement incrémental
+    """
+    global _index, _source, _loaded_at, _full_loaded_at
+    # Index plus ancien réinstallé (retour arrière): nouveau numéro de version, les numéros
+    # servis restent croissants (le cache sémantique ignore les versions antérieures)
+    if _index is not None and index.version < _index.version:
+        index.version = next(_version_counter)
+    _source = dict(index.source)
+    _index = index
+    _loaded_at = time.monotonic()
+    if full:
+        _full_loaded_at = _loaded_at
+
+
+def build_index(source: Dict[str, Any] = None) -> VectorIndex:
+    """
+    Construit un index depuis la collection d'une version (synchrone, via pymongo), sans l'installer
+    Réservé au préchargement hors boucle d'événements (processus parent gunicorn)
+    """
+    source = source or _source
+    docs = list(db.get_database()[source["collection"]].find({}, VECTOR_PROJECTION))
+    return VectorIndex(docs, source)
+
+
+async def extend_index_async(index: VectorIndex) -> VectorIndex:
+    """
+    Rafraîchissement incrémental: lit uniquement les documents ajoutés après le dernier _id chargé
+    Retourne le même index s'il n'y a rien de nouveau (version inchangée, caches conservés)
+    """
+    collection = db.get_async_database()[index.source["collection"]]
+    cursor = collection.find({"_id": {"$gt": index.last_id}}, VECTOR_PROJECTION)
+    docs = await cursor.to_list(length=None)
+    if not docs:
+        return index
+    return await asyncio.to_thread(index.extended, docs)
+
+
+async def build_index_async(source: Dict[str, Any] = None) -> VectorIndex:
+    """
+    Construit un index sans bloquer la boucle d'événements, sans l'installer:
+    lecture via Motor, construction de la matrice dans un thread
+    """
+    source = source or _source
+    cursor = db.get_async_database()[source["collection"]].find({}, VECTOR_PROJECTION)
+    docs = await cursor.to_list(length=None)
+    return await asyncio.to_thread(VectorIndex, docs, source)
+
+
+async def load_index_async() -> VectorIndex:
+    """
+    Charge (ou recharge) l'index de la version servie de façon asynchrone
+    Rechargement complet périodique, incrémental entre deux rechargements complets
+    """
+    source = dict(_source)
+    full = (_index is None or _index.last_id is None
+            or _index.source.get("collection") != source["collection"]
+            or (time.monotonic() - _full_loaded_at) > FULL_REFRESH_INTERVAL_SECONDS)
+    if full:
+        index = await build_index_async(source)
+    else:
+        index = await extend_index_async(_index)
+    # Ne pas écraser une autre version installée pendant le chargement
+    if _source.get("collection") == source["collection"]:
+        install(index, full=full)
+    return _index
+
+
+async def get_index_async() -> VectorIndex:
+    """
+    Retourne l'index servi, sans jamais le rafraîchir dans le chemin de la requête
+    (rafraîchissement périodique: refresh_periodically). Chargement uniquement s'il est absent
+    (échec du chargement au démarrage)
+    """
+    if _index is not None:
+        return _index
+    async with _get_refresh_lock():
+        if _index is None:
+            await load_index_async()
+    return _index
+
+
+async def refresh_periodically() -> None:
+    """
+    Rafraîchit l'index en arrière-plan toutes les REFRESH_INTERVAL_SECONDS
+    (incrémental, complet toutes les FULL_REFRESH_INTERVAL_SECONDS)
+    Tâche lancée au démarrage; inactive dans les workers partageant l'index du parent
+    """
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+        if _frozen:
+            continue
+        try:
+            async with _get_refresh_lock():
+                await load_index_async()
+        except Exception as e:
+            print(f"⚠️  Erreur lors du rafraîchissement de l'index: {e}")
+
+
+def get_index_stats() -> Dict[str, Any]:
+    """
+    Statistiques de l'index en mémoire
+    """
+    if _index is None:
+        return {"loaded": False}
+    return {
+        "loaded": True,
+        "vectors": len(_index),
+        "dimension": _index.dimension,
+        "version": _index.version,
+        "embedding_version": _index.source.get("version_id"),
+        "model_name": _index.model_name,
+        "collection": _index.source.get("collection"),
+        "matrix_mb": round(_index.matrix.nbytes / (1024 * 1024), 2),
+        "lexical_terms": len(_index.lexical.postings),
+        "age_seconds": round(time.monotonic() - _loaded_at, 1),
+        "full_reload_age_seconds": round(time.monotonic() - _full_loaded_at, 1),
+        "frozen": _frozen,
+    }
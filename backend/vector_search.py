@@ -6,10 +6,17 @@ Note: Utilise une recherche vectorielle manuelle (calcul de similarité cosinus)
 """
 from sentence_transformers import SentenceTransformer
 from langdetect import detect
-from typing import Tuple, List, Dict, Any, Set
+from typing import Tuple, List, Dict, Any, Set, Optional
 import numpy as np
+import asyncio
 import re
 import db
+import vector_index
+import admission
+import semantic_cache
+import embedding_versions
+import input_policy
+import lexical_index
 
 # Modèle sentence-transformers pour générer les embeddings
 # IMPORTANT: Ce modèle DOIT être exactement le même que celui utilisé pour créer les embeddings dans MongoDB
@@ -19,22 +26,41 @@ import db
 #   - paraphrase-multilingual-mpnet-base-v2 (768 dim, très performant)
 #   - paraphrase-multilingual-MiniLM-L12-v2 (384 dim, bon compromis)
 # 
-# Note: Si vous changez de modèle, vous DEVEZ recréer tous les embeddings dans wydad_vector
+# Note: Pour changer de modèle sans interruption, construisez une nouvelle version d'embeddings
+#       (create_embeddings_new_model.py) puis activez-la (voir embedding_versions.py)
 MODEL_NAME = "all-MiniLM-L6-v2"  # 384 dimensions, modèle anglais (limité pour le français)
 
-# Instance globale du modèle (chargé une seule fois)
-_model: SentenceTransformer = None
+# Instances globales des modèles (chacun chargé une seule fois)
+# Plusieurs modèles peuvent être chargés pendant une migration (ancienne/nouvelle version, shadow)
+_models: Dict[str, SentenceTransformer] = {}
 
 
-def get_model() -> SentenceTransformer:
+def get_model(model_name: str = None) -> SentenceTransformer:
     """
-    Retourne le modèle sentence-transformers (singleton)
+    Retourne le modèle sentence-transformers (singleton par nom de modèle)
     Le modèle est chargé une seule fois pour optimiser les performances
+    
+    Args:
+        model_name: Nom du modèle, None pour le modèle de la version d'embeddings servie
     """
-    global _model
-    if _model is None:
-        _model = SentenceTransformer(MODEL_NAME)
-    return _model
+    name = model_name or vector_index.get_model_name() or MODEL_NAME
+    if name not in _models:
+        _models[name] = SentenceTransformer(name)
+    return _models[name]
+
+
+def loaded_models() -> List[str]:
+    """
+    Noms des modèles actuellement chargés en mémoire
+    """
+    return list(_models)
+
+
+def unload_model(model_name: str) -> None:
+    """
+    Libère un modèle qui n'est plus utilisé (ancienne version d'embeddings)
+    """
+    _models.pop(model_name, None)
 
 
 # Dictionnaires pour l'extraction d'entités
@@ -167,17 +193,9 @@ def calculate_keyword_overlap_score(query_text: str, doc_text: str) -> float:
     Returns:
         Score entre 0 et 1
     """
-    # Tokeniser en mots (simple)
-    query_words = set(re.findall(r'\b\w+\b', query_text.lower()))
-    doc_words = set(re.findall(r'\b\w+\b', doc_text.lower()))
-    
-    # Mots communs (exclure les mots trop courts et trop communs)
-    stopwords = {'le', 'la', 'les', 'de', 'du', 'des', 'et', 'ou', 'a', 'à', 
-                 'un', 'une', 'pour', 'avec', 'dans', 'sur', 'the', 'a', 'an',
-                 'and', 'or', 'for', 'with', 'in', 'on', 'at', 'to', 'of'}
-    
-    query_words = {w for w in query_words if len(w) > 2 and w not in stopwords}
-    doc_words = {w for w in doc_words if len(w) > 2 and w not in stopwords}
+    # Mots-clés (mêmes règles que l'index BM25: sans mots trop courts ni mots vides)
+    query_words = set(lexical_index.tokenize(query_text))
+    doc_words = set(lexical_index.tokenize(doc_text))
     
     if not query_words:
         return 0.0
@@ -272,18 +290,19 @@ def detect_language(text: str) -> str:
         return "fr" if any(char in text for char in "àâäéèêëïîôùûüÿç") else "en"
 
 
-def generate_embedding(text: str, normalize: bool = False) -> List[float]:
+def generate_embedding(text: str, normalize: bool = False, model_name: str = None) -> List[float]:
     """
     Génère un embedding vectoriel pour le texte donné
     
     Args:
         text: Le texte à encoder
         normalize: Si True, normalise l'embedding (pour améliorer la similarité cosinus)
+        model_name: Modèle à utiliser, None pour le modèle de la version servie
         
     Returns:
-        Liste de 384 floats représentant l'embedding
+        Liste de floats représentant l'embedding (384 pour le modèle par défaut)
     """
-    model = get_model()
+    model = get_model(model_name)
     # Optimisation: utiliser show_progress_bar=False pour plus de rapidité
     # Normaliser les embeddings peut améliorer la précision de la similarité cosinus
     embedding = model.encode(
@@ -295,6 +314,75 @@ def generate_embedding(text: str, normalize: bool = False) -> List[float]:
     return embedding.tolist()
 
 
+def generate_embeddings(texts: List[str], normalize: bool = False, batch_size: int = 64,
+                        model_name: str = None) -> np.ndarray:
+    """
+    Génère les embeddings d'un lot de textes
+    
+    Les textes sont regroupés par tranche de longueur (input_policy.length_buckets):
+    chaque tranche est encodée séparément, avec des lots plus grands pour les textes
+    courts et plus petits pour les textes longs (moins de padding, mémoire bornée)
+    
+    Args:
+        texts: Les textes à encoder
+        normalize: Si True, normalise les embeddings
+        batch_size: Taille de lot maximale passée au modèle
+        model_name: Modèle à utiliser, None pour le modèle de la version servie
+        
+    Returns:
+        Matrice NumPy (nombre de textes x dimension), dans l'ordre des textes
+    """
+    model = get_model(model_name)
+    embeddings = None
+    for indices, bucket_batch_size in input_policy.length_buckets(texts, max_batch_size=batch_size):
+        bucket_embeddings = model.encode(
+            [texts[i] for i in indices],
+            batch_size=bucket_batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+            normalize_embeddings=normalize
+        )
+        if embeddings is None:
+            embeddings = np.zeros((len(texts), bucket_embeddings.shape[1]), dtype=bucket_embeddings.dtype)
+        embeddings[indices] = bucket_embeddings
+    if embeddings is None:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return embeddings
+
+
+def encode_query(text: str, model_name: str = None, chunking: bool = True) -> np.ndarray:
+    """
+    Encode une requête selon la politique d'entrée (input_policy)
+    Un texte plus long que la longueur maximale du modèle est découpé en morceaux de phrases
+    au lieu d'être tronqué silencieusement
+    
+    Args:
+        text: Texte de la requête (déjà limité par input_policy.cap_text)
+        model_name: Modèle à utiliser, None pour le modèle de la version servie
+        chunking: Si False (mode dégradé), un seul encodage (texte tronqué par le modèle)
+        
+    Returns:
+        Vecteur (dimension) pour un texte court, matrice (morceaux x dimension) pour un texte découpé
+    """
+    chunks = input_policy.chunk_text(text, get_model(model_name)) if chunking else [text]
+    if len(chunks) == 1:
+        return np.asarray(generate_embedding(chunks[0], False, model_name), dtype=np.float32)
+    return generate_embeddings(chunks, normalize=False, model_name=model_name)
+
+
+def query_vector(query_embedding) -> np.ndarray:
+    """
+    Vecteur unique représentant une requête (moyenne des morceaux normalisés si découpée)
+    Utilisé comme clé du cache sémantique
+    """
+    embedding = np.asarray(query_embedding, dtype=np.float32)
+    if embedding.ndim == 1:
+        return embedding
+    norms = np.linalg.norm(embedding, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (embedding / norms).mean(axis=0)
+
+
 def normalize_vector(vec: np.ndarray) -> np.ndarray:
     """
     Normalise un vecteur pour améliorer la similarité cosinus
@@ -369,7 +457,8 @@ def vector_search(query_embedding: List[float], limit: int = 3, language_filter:
     Returns:
         Liste de documents correspondants avec leurs scores de similarité
     """
-    vectors_collection = db.get_vectors_collection()
+    # Collection de la version d'embeddings servie (wydad_vector par défaut)
+    vectors_collection = db.get_database()[vector_index.current_source()["collection"]]
     news_collection = db.get_news_collection()
     
     # Construire le filtre MongoDB
@@ -436,17 +525,50 @@ def vector_search(query_embedding: List[float], limit: int = 3, language_filter:
         }
         
         # Ajouter les informations de l'article si trouvé
-        if article:
-            result_doc["title_fr"] = article.get("title_fr")
-            result_doc["title_en"] = article.get("title_en")
-            result_doc["title_ar"] = article.get("title_ar")
-            result_doc["image"] = article.get("image")
+        _attach_article(result_doc, article)
         
         results.append(result_doc)
     
     return results
 
 
+def _attach_article(result_doc: Dict[str, Any], article: Dict[str, Any]) -> None:
+    """
+    Ajoute les informations de l'article wydad_news au document de résultat
+    """
+    if article:
+        result_doc["title_fr"] = article.get("title_fr")
+        result_doc["title_en"] = article.get("title_en")
+        result_doc["title_ar"] = article.get("title_ar")
+        result_doc["image"] = article.get("image")
+
+
+async def attach_articles_async(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fait le lookup vers wydad_news pour tous les résultats en une seule requête Motor
+    (au lieu d'un find_one par résultat)
+    
+    Args:
+        results: Documents de résultat contenant le champ 'url'
+        
+    Returns:
+        Les mêmes documents, complétés avec les titres et l'image de l'article
+    """
+    urls = list({result["url"] for result in results if result.get("url")})
+    if not urls:
+        return results
+    
+    cursor = db.get_async_news_collection().find(
+        {"url": {"$in": urls}},
+        {"_id": 0, "url": 1, "title_fr": 1, "title_en": 1, "title_ar": 1, "image": 1}
+    )
+    articles = {article["url"]: article for article in await cursor.to_list(length=len(urls))}
+    
+    for result in results:
+        _attach_article(result, articles.get(result.get("url")))
+    return results
+
+
 def find_closest_article(user_text: str, language: str = None) -> Tuple[Dict[str, Any], float]:
     """
     Trouve l'article le plus proche du texte utilisateur avec re-ranking hybride
@@ -496,3 +618,221 @@ def find_closest_article(user_text: str, language: str = None) -> Tuple[Dict[str
     
     return closest, final_score
 
+
+
+def rank_candidates(index: "vector_index.VectorIndex", query_embedding, user_text: str, language: str,
+                    top_k: int = 20, hits: List[Tuple[int, float]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Recherche TOP-K dans un index, fusion avec les candidats BM25 puis re-ranking hybride
+    (sans lookup wydad_news)
+    
+    Args:
+        index: Index vectoriel (version d'embeddings) à interroger
+        query_embedding: Embedding de la requête (même modèle que l'index),
+            ou matrice des morceaux pour un texte découpé
+        user_text: Texte de la requête
+        language: Langue de la requête
+        top_k: Nombre de candidats cosinus
+        hits: Candidats déjà calculés (recherche par lot), None pour interroger l'index
+        
+    Returns:
+        Le document le plus proche, ou None si l'index ne contient aucun candidat
+    """
+    # Étape 1: Recherche TOP-K par similarité cosinus
+    # (texte découpé en morceaux: scores agrégés sur les morceaux)
+    if np.ndim(query_embedding) == 2:
+        def search(language_filter):
+            return index.search_pooled(query_embedding, limit=top_k, language_filter=language_filter,
+                                       pooling=input_policy.CHUNK_POOLING)
+    else:
+        def search(language_filter):
+            return index.search(query_embedding, limit=top_k, language_filter=language_filter)
+    
+    language_filter = language
+    if not hits:
+        hits = search(language_filter)
+    
+    # Si pas de résultats avec le filtre de langue, essayer sans filtre
+    if not hits:
+        language_filter = None
+        hits = search(language_filter)
+    
+    if not hits:
+        return None
+    
+    # Étape 2: Candidats lexicaux BM25 (index inversé), fusionnés avec les candidats cosinus
+    # par reciprocal rank fusion: les correspondances exactes mal classées par le cosinus
+    # atteignent ainsi le re-ranking
+    lexical_hits = index.search_lexical(user_text, limit=lexical_index.LEXICAL_TOP_K,
+                                        language_filter=language_filter)
+    rows = lexical_index.fuse_candidates([row for row, _ in hits], [row for row, _ in lexical_hits],
+                                         limit=max(lexical_index.FUSED_CANDIDATES, len(hits)))
+    
+    # Score cosinus des candidats trouvés uniquement par BM25
+    cosine_scores = dict(hits)
+    missing = [row for row in rows if row not in cosine_scores]
+    if missing:
+        scores = index.similarity(query_embedding, input_policy.CHUNK_POOLING, rows=missing)
+        cosine_scores.update(zip(missing, scores.tolist()))
+    
+    cosine_results = [index.document(row, cosine_scores[row]) for row in rows]
+    
+    # Étapes 3 et 4: Extraction d'entités et re-ranking hybride
+    query_entities = extract_entities(user_text, language)
+    return re_rank_results(cosine_results, user_text, query_entities, language)[0]
+
+
+async def find_closest_article_async(user_text: str, language: str = None,
+                                     deadline: "admission.Deadline" = None,
+                                     reduced: bool = False,
+                                     cache_only: bool = False) -> Tuple[Dict[str, Any], float]:
+    """
+    Version asynchrone de find_closest_article pour les handlers FastAPI
+    
+    - L'encodage (CPU) s'exécute dans un thread
+    - La recherche utilise l'index en mémoire (rafraîchi via Motor sans bloquer)
+    - Le lookup wydad_news se fait via Motor en une seule requête
+    - Le modèle et l'index proviennent de la même version d'embeddings,
+      même si une bascule a lieu pendant la requête
+    
+    Args:
+        user_text: Le texte de l'utilisateur à analyser
+        language: Langue du texte ("fr" ou "en"), None pour détection automatique
+        deadline: Échéance de la requête (None: pas d'échéance)
+            Lève DeadlineExceeded si elle passe avant la fin de l'encodage
+            (la place d'admission reste réservée jusqu'à la fin du thread d'encodage)
+        reduced: Si True (mode dégradé), encodage réduit: texte limité à
+            input_policy.REDUCED_MAX_INPUT_CHARS, sans découpage en morceaux
+            (le re-ranking hybride, peu coûteux, est conservé: le score reste comparable aux seuils)
+        cache_only: Si True (mode dégradé), seul le cache sémantique est consulté, à partir
+            du même encodage réduit qu'en mode reduced (jamais d'encodage par morceaux)
+            Lève CacheMiss si aucune requête proche n'est en cache
+        
+    Returns:
+        Tuple (document le plus proche, score final hybride)
+    """
+    # Échéance vérifiée avant tout travail: une requête déjà expirée ne lance pas d'encodage
+    if deadline is not None:
+        deadline.check("encodage")
+    index = await vector_index.get_index_async()
+    
+    # Modes dégradés: un seul encodage, texte limité, sans découpage
+    # (en cache_only, le résultat ne sert qu'à consulter le cache)
+    cheap = reduced or cache_only
+    if cheap:
+        user_text = input_policy.cap_text(user_text, input_policy.REDUCED_MAX_INPUT_CHARS)
+    else:
+        user_text = input_policy.cap_text(user_text)
+    
+    encode = asyncio.ensure_future(asyncio.to_thread(encode_query, user_text, index.model_name,
+                                                     chunking=not cheap))
+    if deadline is None:
+        query_embedding = await encode
+    else:
+        # Le thread d'encodage ne peut pas être interrompu: la place d'admission
+        # reste occupée jusqu'à sa fin, même si la requête expire avant
+        deadline.hold_until(encode)
+        try:
+            query_embedding = await asyncio.wait_for(asyncio.shield(encode), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            raise admission.DeadlineExceeded("Échéance dépassée pendant l'encodage")
+    
+    if language is None:
+        language = detect_language(user_text)
+    
+    # Étape 0: Cache sémantique (requête quasi identique déjà analysée)
+    cache_key = query_vector(query_embedding)
+    cached = semantic_cache.cache.lookup(cache_key, language, index.version)
+    if cached is not None:
+        return cached
+    if cache_only:
+        raise semantic_cache.CacheMiss("Serveur surchargé: seules les réponses déjà en cache sont servies")
+    
+    # Recherche et re-ranking hybride (quelques millisecondes, même après l'échéance)
+    closest = rank_candidates(index, query_embedding, user_text, language)
+    if closest is None:
+        raise ValueError("Aucun article trouvé dans la base de données")
+    
+    await attach_articles_async([closest])
+    final_score = closest.get('score_final', closest.get('score', 0.0))
+    
+    # Seuls les résultats complets (texte entier, sans mode dégradé) sont mis en cache
+    # et comparés avec la version en shadow
+    if not reduced:
+        semantic_cache.cache.store(cache_key, language, closest, final_score, index.version)
+        embedding_versions.submit_shadow(user_text, language, closest, final_score)
+    
+    return closest, final_score
+
+
+def _rank_batch(index: "vector_index.VectorIndex", texts: List[str],
+                top_k: int = 20) -> List[Tuple[Dict[str, Any], float, str]]:
+    """
+    Encodage, recherche et re-ranking d'un lot de textes (exécuté dans un thread)
+    
+    Returns:
+        Pour chaque texte: (document le plus proche ou None, score final, langue)
+    """
+    texts = [input_policy.cap_text(text) for text in texts]
+    languages = [detect_language(text) for text in texts]
+    
+    # Textes plus longs que la longueur maximale du modèle (estimation): encodés directement
+    # par morceaux, sans passer aussi par l'encodage par lot du texte entier
+    chunk_budget = input_policy.max_tokens(get_model(index.model_name))
+    short = [i for i, text in enumerate(texts)
+             if not input_policy.CHUNKING_ENABLED or input_policy.estimate_tokens(text) <= chunk_budget]
+    
+    embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+    all_hits: List[Optional[List[Tuple[int, float]]]] = [None] * len(texts)
+    if short:
+        short_embeddings = generate_embeddings([texts[i] for i in short], normalize=False,
+                                               model_name=index.model_name)
+        short_hits = index.search_batch(short_embeddings, limit=top_k,
+                                        language_filters=[languages[i] for i in short])
+        for i, embedding, hits in zip(short, short_embeddings, short_hits):
+            embeddings[i], all_hits[i] = embedding, hits
+    
+    ranked = []
+    for i, (text, language) in enumerate(zip(texts, languages)):
+        embedding, hits = embeddings[i], all_hits[i]
+        if embedding is None:
+            embedding = encode_query(text, index.model_name)
+        
+        # Cache consulté sans effet et jamais alimenté: un gros fichier ne doit pas
+        # évincer les requêtes interactives de /analyze ni fausser ses statistiques
+        cached = semantic_cache.cache.lookup(query_vector(embedding), language, index.version, peek=True)
+        if cached is not None:
+            ranked.append((cached[0], cached[1], language))
+            continue
+        
+        closest = rank_candidates(index, embedding, text, language, top_k=top_k, hits=hits)
+        if closest is None:
+            ranked.append((None, 0.0, language))
+            continue
+        
+        ranked.append((closest, closest.get('score_final', closest.get('score', 0.0)), language))
+    
+    return ranked
+
+
+async def find_closest_articles_batch_async(texts: List[str]) -> List[Tuple[Dict[str, Any], float, str]]:
+    """
+    Version par lot de find_closest_article_async (analyse en masse)
+    
+    L'encodage utilise un seul appel au modèle pour tout le lot et la recherche
+    un seul produit matriciel. Le lookup wydad_news n'est fait que pour les meilleurs résultats.
+    
+    Args:
+        texts: Les textes à analyser
+        
+    Returns:
+        Pour chaque texte: (document le plus proche ou None si aucun résultat, score final, langue)
+    """
+    if not texts:
+        return []
+    
+    index = await vector_index.get_index_async()
+    ranked = await asyncio.to_thread(_rank_batch, index, texts)
+    
+    await attach_articles_async([doc for doc, _, _ in ranked if doc is not None])
+    return ranked
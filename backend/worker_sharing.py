@@ -0,0 +1,134 @@
+"""
+Module de partage du modèle et de l'index entre workers
+Mode multi-workers (gunicorn + preload_app): le modèle sentence-transformers et
+la matrice d'embeddings sont chargés une seule fois dans le processus parent,
+puis partagés par les workers via fork (copy-on-write).
+
+- Les poids du modèle et la matrice NumPy sont des tampons contigus jamais modifiés:
+  leurs pages restent partagées
+- gc.freeze() évite que le ramasse-miettes des workers touche (et copie) les objets du parent
+- L'index est figé dans les workers: pour le recharger, envoyer SIGHUP au parent gunicorn
+
+Usage (mesure de la mémoire des workers):
+    python3 worker_sharing.py <pid du parent gunicorn>
+"""
+from typing import Dict, Any, Optional, List
+import gc
+import os
+import sys
+import vector_index
+import embedding_versions
+import db
+
+# Le mode partagé est actif dans ce processus (worker forké après préchargement)
+_shared_mode: bool = False
+
+
+def preload_in_parent() -> None:
+    """
+    Charge le modèle et l'index dans le processus parent, avant le fork des workers
+    N'exécute aucune inférence (le pool de threads OpenMP ne doit pas exister avant fork)
+    """
+    print("🔄 Préchargement du modèle et de l'index dans le processus parent...")
+    # Modèle et index de la version d'embeddings active
+    index = embedding_versions.initialize_sync()
+    print(f"✅ Modèle et index chargés ({len(index)} vectorisations)")
+
+    # Rechargement (SIGHUP) après une bascule: ne garder que le modèle de la version active,
+    # sinon chaque nouveau worker hériterait de tous les modèles précédents
+    embedding_versions._unload_unused()
+
+    # Les clients MongoDB ne doivent pas être partagés entre processus
+    db.close_connection()
+
+    # Déplacer les objets existants dans la génération permanente:
+    # le GC des workers ne les parcourt plus et ne touche donc pas leurs pages
+    # (unfreeze d'abord: les objets figés lors d'un préchargement précédent doivent pouvoir être libérés)
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork(workers: int = 1) -> None:
+    """
+    Initialisation d'un worker après fork
+
+    Args:
+        workers: Nombre total de workers (pour répartir les threads de calcul)
+    """
+    global _shared_mode
+    _shared_mode = True
+    vector_index.freeze()
+
+    # Éviter que chaque worker utilise tous les cœurs pour l'encodage
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, workers)))
+    except ImportError:
+        pass
+
+
+def get_memory_stats(pid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Mémoire résidente d'un processus (Linux: /proc/<pid>/smaps_rollup)
+
+    - rss_mb: mémoire résidente totale (compte les pages partagées dans chaque processus)
+    - pss_mb: part proportionnelle (les pages partagées sont divisées entre les processus)
+    - shared_mb / private_mb: pages partagées / propres au processus
+
+    Args:
+        pid: Processus à mesurer (None pour le processus courant)
+    """
+    pid = pid or os.getpid()
+    stats: Dict[str, Any] = {"pid": pid, "shared_mode": _shared_mode if pid == os.getpid() else None}
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_mb", "Shared_Dirty": "shared_mb",
+              "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                key = parts[0].rstrip(":")
+                if key in fields and len(parts) >= 2:
+                    name = fields[key]
+                    stats[name] = stats.get(name, 0.0) + int(parts[1]) / 1024
+    except OSError:
+        # Hors Linux: seul le pic de mémoire résidente du processus courant est disponible
+        if pid == os.getpid():
+            import resource
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            stats["max_rss_mb"] = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+    for key, value in stats.items():
+        if isinstance(value, float):
+            stats[key] = round(value, 1)
+    return stats
+
+
+def get_children(pid: int) -> List[int]:
+    """
+    Liste les processus enfants (workers) d'un processus
+    """
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 worker_sharing.py <pid du parent gunicorn>")
+        sys.exit(1)
+
+    parent = int(sys.argv[1])
+    rows = [("parent", get_memory_stats(parent))]
+    rows += [("worker", get_memory_stats(child)) for child in get_children(parent)]
+
+    print(f"{'rôle':<8} {'pid':>8} {'RSS (Mo)':>10} {'PSS (Mo)':>10} {'partagé':>10} {'privé':>10}")
+    for role, stats in rows:
+        print(f"{role:<8} {stats['pid']:>8} {stats.get('rss_mb', 0):>10} {stats.get('pss_mb', 0):>10} "
+              f"{stats.get('shared_mb', 0):>10} {stats.get('private_mb', 0):>10}")
+    total_pss = sum(stats.get("pss_mb", 0) for _, stats in rows)
+    print(f"\nMémoire totale réelle (somme des PSS): {round(total_pss, 1)} Mo")